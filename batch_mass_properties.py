@@ -0,0 +1,246 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Headless weight and CG report over a directory of .blend files.
+#
+# blender -b --python bpyutils/batch_mass_properties.py -- \
+#     --input hulls/ --output reports/ --prefix Bulkhead --prefix Keel --jobs 8
+#
+# Every .blend file is measured by its own background Blender process, at most
+# --jobs at a time. Each worker writes one row per object plus a TOTAL row to
+# <output>/<file>.csv (or .jsonl with --format json). Files that already have
+# an output are skipped so an interrupted run can be started again.
+
+import argparse
+import csv
+import importlib
+import json
+import os
+import subprocess
+import sys
+
+from concurrent.futures import ThreadPoolExecutor
+
+fields=["file","object","weight","volume","area","cg_x","cg_y","cg_z"]
+
+
+def parse_args(argv):
+
+	# blender passes script arguments after --
+	if "--" in argv:
+		argv=argv[argv.index("--")+1:]
+	else:
+		argv=[]
+
+	parser = argparse.ArgumentParser(description="Weight and CG report over many .blend files")
+	parser.add_argument("--input", help="directory of .blend files")
+	parser.add_argument("--output", required=True, help="report directory")
+	parser.add_argument("--prefix", action="append", default=[], help="object name prefix (repeatable)")
+	parser.add_argument("--collection", action="append", default=[], help="collection name (repeatable)")
+	parser.add_argument("--format", choices=["csv","json"], default="csv")
+	parser.add_argument("--jobs", type=int, default=os.cpu_count())
+	parser.add_argument("--blender", help="blender executable (default: the running one)")
+	parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+
+	return parser.parse_args(argv)
+
+
+def output_path(args, blend_file):
+	name=os.path.splitext(os.path.basename(blend_file))[0]
+	extension = "csv" if args.format=="csv" else "jsonl"
+	return os.path.join(args.output, "%s.%s"%(name,extension))
+
+
+# ================================================
+# worker - runs inside blender with the .blend file loaded
+
+
+def import_helper(name):
+	"""import a helper module of this submodule from a blender --python script
+
+	the helpers use package relative imports (..bpyutils) so they are
+	imported through the package that contains this submodule
+	"""
+
+	here=os.path.dirname(os.path.abspath(__file__))
+	parent=os.path.dirname(here)
+
+	if os.path.dirname(parent) not in sys.path:
+		sys.path.insert(0, os.path.dirname(parent))
+
+	return importlib.import_module("%s.%s.%s"%(
+		os.path.basename(parent), os.path.basename(here), name))
+
+
+def select_objects(bpy, args):
+
+	if args.collection:
+		candidates=[]
+		for name in args.collection:
+			collection=bpy.data.collections.get(name)
+			if collection is not None:
+				candidates.extend(collection.all_objects)
+	else:
+		candidates=bpy.context.scene.objects
+
+	objects=[]
+	names=set()
+	for obj in candidates:
+		if obj.type!="MESH" or obj.name in names:
+			continue
+
+		if args.prefix and not obj.name.startswith(tuple(args.prefix)):
+			continue
+
+		names.add(obj.name)
+		objects.append(obj)
+
+	return objects
+
+
+class RowWriter:
+
+	def __init__(self, stream, format):
+		self.stream=stream
+		self.format=format
+
+		if format=="csv":
+			self.writer=csv.DictWriter(stream, fieldnames=fields)
+			self.writer.writeheader()
+
+	def write(self, row):
+		if self.format=="csv":
+			self.writer.writerow(row)
+		else:
+			self.stream.write(json.dumps(row)+"\n")
+
+		self.stream.flush()
+
+
+def run_worker(args):
+	import bpy
+
+	measure_helper=import_helper("measure_helper")
+
+	blend_file=bpy.data.filepath
+	path=output_path(args, blend_file)
+	partial=path+".part"
+
+	objects=select_objects(bpy, args)
+
+	total_weight=0
+	total_moment=[0,0,0]
+
+	with open(partial, "w", newline="") as stream:
+		writer=RowWriter(stream, args.format)
+
+		with measure_helper.MeasurementSession() as session:
+			for obj in objects:
+				props=measure_helper.mass_properties(obj, session=session)
+				weight=measure_helper.plate_weight(props)
+				cg=props.volume_centroid
+
+				total_weight+=weight
+				for i in range(3):
+					total_moment[i]+=weight*cg[i]
+
+				writer.write({"file":os.path.basename(blend_file), "object":obj.name,
+					"weight":weight, "volume":props.volume, "area":props.area,
+					"cg_x":cg.x, "cg_y":cg.y, "cg_z":cg.z})
+
+		cg=[0,0,0]
+		if total_weight>0:
+			cg=[m/total_weight for m in total_moment]
+
+		writer.write({"file":os.path.basename(blend_file), "object":"TOTAL",
+			"weight":total_weight, "volume":"", "area":"",
+			"cg_x":cg[0], "cg_y":cg[1], "cg_z":cg[2]})
+
+	# only complete reports count as done when resuming
+	os.replace(partial, path)
+
+	print("%s: %d objects Total weight: %f KG"%(blend_file,len(objects),total_weight))
+
+
+# ================================================
+# driver - fans the files out over background blender processes
+
+
+def run_file(blender, blend_file, args):
+
+	command=[blender, "-b", blend_file, "--python-exit-code", "1",
+		"--python", os.path.abspath(__file__), "--",
+		"--worker", "--output", args.output, "--format", args.format]
+
+	for prefix in args.prefix:
+		command+=["--prefix", prefix]
+
+	for collection in args.collection:
+		command+=["--collection", collection]
+
+	result=subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+
+	if result.returncode!=0 or not os.path.exists(output_path(args, blend_file)):
+		print("FAILED: %s\n%s"%(blend_file,result.stdout))
+		return False
+
+	print("Done: %s"%blend_file)
+	return True
+
+
+def run_driver(args):
+
+	blender=args.blender
+	if blender is None:
+		import bpy
+		blender=bpy.app.binary_path
+
+	os.makedirs(args.output, exist_ok=True)
+
+	blend_files=sorted(os.path.join(args.input, f) for f in os.listdir(args.input) if f.endswith(".blend"))
+
+	todo=[f for f in blend_files if not os.path.exists(output_path(args, f))]
+
+	print("Files: %d Already done: %d Jobs: %d"%(len(blend_files),len(blend_files)-len(todo),args.jobs))
+
+	with ThreadPoolExecutor(max_workers=max(args.jobs,1)) as pool:
+		results=list(pool.map(lambda f: run_file(blender, f, args), todo))
+
+	failed=results.count(False)
+	print("Finished: %d Failed: %d"%(len(results)-failed,failed))
+
+	return failed==0
+
+
+def main(argv):
+	args=parse_args(argv)
+
+	if args.worker:
+		run_worker(args)
+		return True
+
+	if args.input is None:
+		print("--input directory required")
+		return False
+
+	return run_driver(args)
+
+
+if __name__ == "__main__":
+	if not main(sys.argv):
+		sys.exit(1)
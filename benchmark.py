@@ -0,0 +1,305 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Benchmarks for the measure_helper and material_helper hot paths.
+#
+# blender -b --factory-startup --python bpyutils/benchmark.py -- \
+#     --output bench.json --baseline bench_baseline.json --threshold 0.15
+#
+# Procedural hull-like meshes from 1k to 1M triangles and scenes of 1 to 1000
+# objects are generated in an empty scene. Every case is timed --repeat times
+# and the best time is written to --output as JSON. With --baseline the
+# results are compared and the run fails if any case is slower than the
+# baseline by more than --threshold (0.15 = 15%).
+
+import argparse
+import json
+import math
+import os
+import sys
+import tempfile
+import time
+
+import bpy
+import numpy as np
+
+triangle_counts=[1000,10000,100000,1000000]
+object_counts=[1,10,100,1000]
+
+# bend stress and object count cases are limited to smaller meshes
+bend_stress_max_triangles=100000
+scene_object_triangles=1000
+
+
+def parse_args(argv):
+
+	if "--" in argv:
+		argv=argv[argv.index("--")+1:]
+	else:
+		argv=[]
+
+	parser = argparse.ArgumentParser(description="measure_helper and material_helper benchmarks")
+	parser.add_argument("--output", default="bench_output.json")
+	parser.add_argument("--baseline", help="compare against this results file")
+	parser.add_argument("--threshold", type=float, default=0.15, help="allowed slowdown (fraction)")
+	parser.add_argument("--repeat", type=int, default=3)
+	parser.add_argument("--max-triangles", type=int, default=max(triangle_counts))
+	parser.add_argument("--max-objects", type=int, default=max(object_counts))
+	parser.add_argument("--filter", default="", help="only run cases containing this text")
+
+	return parser.parse_args(argv)
+
+
+def import_helpers():
+	# blender does not put the script directory on sys.path
+	sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+	from batch_mass_properties import import_helper
+
+	return import_helper("measure_helper"), import_helper("material_helper")
+
+
+# ================================================
+# procedural test geometry
+
+
+def hull_mesh_data(triangles):
+	"""vertices and quad faces of a closed hull-like tube with n-gon end caps"""
+
+	# 2 triangles per quad: rings * segments * 2 ~= triangles
+	segments=max(int(math.sqrt(triangles/8)),4)
+	rings=max(int(triangles/(2*segments)),2)
+
+	x=np.linspace(-5,5,rings)
+	angle=np.linspace(0,2*math.pi,segments,endpoint=False)
+
+	# beam narrows towards bow and stern, flatter deck than keel
+	beam=1+0.5*np.cos(x/5*math.pi/2)
+	y=np.outer(beam,np.cos(angle))
+	z=np.outer(beam*0.6,np.sin(angle))
+	z=np.where(z>0,z*0.5,z)
+
+	co=np.stack([np.repeat(x,segments),y.ravel(),z.ravel()],axis=1)
+
+	ring=np.arange(rings-1)[:,None]*segments
+	seg=np.arange(segments)[None,:]
+	nxt=(seg+1)%segments
+
+	quads=np.stack([ring+seg, ring+nxt, ring+segments+nxt, ring+segments+seg],axis=2).reshape(-1,4)
+
+	caps=[list(range(segments))[::-1], list(range((rings-1)*segments,rings*segments))]
+
+	return co, quads, caps
+
+
+def make_hull_object(name, triangles, location=(0,0,0)):
+
+	co, quads, caps=hull_mesh_data(triangles)
+
+	loop_totals=np.concatenate([np.full(len(quads),4), [len(c) for c in caps]])
+	loop_starts=np.concatenate([[0],np.cumsum(loop_totals)[:-1]])
+	loop_verts=np.concatenate([quads.ravel()]+[np.array(c) for c in caps])
+
+	mesh=bpy.data.meshes.new(name)
+	mesh.vertices.add(len(co))
+	mesh.vertices.foreach_set("co", co.astype(np.float32).ravel())
+	mesh.loops.add(len(loop_verts))
+	mesh.loops.foreach_set("vertex_index", loop_verts.astype(np.int32))
+	mesh.polygons.add(len(loop_totals))
+	mesh.polygons.foreach_set("loop_start", loop_starts.astype(np.int32))
+	mesh.polygons.foreach_set("loop_total", loop_totals.astype(np.int32))
+	mesh.update(calc_edges=True)
+
+	obj=bpy.data.objects.new(name, mesh)
+	obj.location=location
+	bpy.context.scene.collection.objects.link(obj)
+
+	return obj
+
+
+def clear_scene():
+	for obj in list(bpy.data.objects):
+		bpy.data.objects.remove(obj)
+
+	for mesh in list(bpy.data.meshes):
+		bpy.data.meshes.remove(mesh)
+
+	for mat in list(bpy.data.materials):
+		bpy.data.materials.remove(mat)
+
+
+# ================================================
+# timing
+
+
+def best_time(function, repeat, setup=None):
+
+	times=[]
+	for i in range(repeat):
+		if setup is not None:
+			setup()
+
+		start=time.perf_counter()
+		function()
+		times.append(time.perf_counter()-start)
+
+	return min(times)
+
+
+class Benchmarks:
+
+	def __init__(self, args):
+		self.args=args
+		self.results={}
+
+	def run(self, name, function, setup=None):
+
+		if self.args.filter not in name:
+			return
+
+		seconds=best_time(function, self.args.repeat, setup)
+		self.results[name]=seconds
+
+		print("%-50s %10.4f s"%(name,seconds))
+
+
+def mesh_benchmarks(bench, measure_helper):
+
+	for triangles in triangle_counts:
+		if triangles>bench.args.max_triangles:
+			continue
+
+		clear_scene()
+		obj=make_hull_object("Bulkhead_bench", triangles)
+
+		suffix="[%d tris]"%triangles
+
+		bench.run("measure_helper.cg_mesh "+suffix, lambda: measure_helper.cg_mesh(obj))
+		bench.run("measure_helper.mass_properties "+suffix, lambda: measure_helper.mass_properties(obj))
+		bench.run("measure_helper.measure_object_volume "+suffix, lambda: measure_helper.measure_object_volume(obj))
+		bench.run("measure_helper.measure_face_area "+suffix, lambda: measure_helper.measure_face_area(obj,True))
+		bench.run("measure_helper.measure_face_count "+suffix, lambda: measure_helper.measure_face_count(obj,True))
+
+		if triangles<=bend_stress_max_triangles:
+			bench.run("measure_helper.calculate_bend_stress "+suffix, lambda: measure_helper.calculate_bend_stress(obj))
+
+
+def scene_benchmarks(bench, measure_helper):
+
+	for count in object_counts:
+		if count>bench.args.max_objects:
+			continue
+
+		clear_scene()
+
+		objects=[make_hull_object("Bulkhead_%04d"%i, scene_object_triangles, (i*0.1,0,0)) for i in range(count)]
+
+		suffix="[%d objects]"%count
+
+		bench.run("measure_helper.calculate_cg "+suffix, lambda: measure_helper.calculate_cg(objects))
+
+
+def material_benchmarks(bench, material_helper):
+
+	builders=[name for name in sorted(dir(material_helper)) if name.startswith("get_material_")]
+	builders.append("get_aluminum_material")
+
+	for name in builders:
+		builder=getattr(material_helper, name)
+		bench.run("material_helper.%s"%name, builder, setup=clear_scene)
+
+	for name in ["make_subsurf_material","make_metalic_material"]:
+		builder=getattr(material_helper, name)
+
+		# colour variants are copies of one prototype
+		def variants(builder=builder):
+			for i in range(50):
+				builder("variant_%02d"%i, [i/50,0.5,0.5,1])
+
+		bench.run("material_helper.%s [50 variants]"%name, variants, setup=clear_scene)
+
+	# all shared materials built from the specs vs loaded from the prebuilt library
+	def build_all():
+		for name in material_helper.library_materials:
+			material_helper.get_library_material(name)
+
+	bench.run("material_helper.build all library materials", build_all, setup=clear_scene)
+
+	with tempfile.TemporaryDirectory() as directory:
+		material_helper.load_material_library(directory)
+		bench.run("material_helper.load_material_library", lambda: material_helper.load_material_library(directory), setup=clear_scene)
+
+
+# ================================================
+
+
+def compare(results, baseline, threshold):
+	"""returns the list of cases slower than baseline by more than threshold"""
+
+	regressions=[]
+
+	for name, seconds in sorted(results.items()):
+		reference=baseline.get(name)
+		if reference is None or reference<=0:
+			continue
+
+		change=seconds/reference-1
+		flag=""
+		if change>threshold:
+			regressions.append(name)
+			flag="REGRESSION"
+
+		print("%-50s %10.4f s %+7.1f%% %s"%(name,seconds,change*100,flag))
+
+	return regressions
+
+
+def main(argv):
+	args=parse_args(argv)
+
+	measure_helper, material_helper=import_helpers()
+
+	bench=Benchmarks(args)
+
+	mesh_benchmarks(bench, measure_helper)
+	scene_benchmarks(bench, measure_helper)
+	material_benchmarks(bench, material_helper)
+
+	clear_scene()
+
+	report={"blender":bpy.app.version_string, "repeat":args.repeat, "results":bench.results}
+
+	with open(args.output,"w") as f:
+		json.dump(report, f, indent=1, sort_keys=True)
+
+	if args.baseline is None:
+		return True
+
+	with open(args.baseline) as f:
+		baseline=json.load(f)["results"]
+
+	regressions=compare(bench.results, baseline, args.threshold)
+
+	print("Regressions: %d (threshold %.0f%%)"%(len(regressions),args.threshold*100))
+
+	return len(regressions)==0
+
+
+if __name__ == "__main__":
+	if not main(sys.argv):
+		sys.exit(1)
@@ -2,14 +2,25 @@ import bpy
 import time
 import functools
 import bmesh
+import json
+import os
+import threading
 
-def select_object(theObject,selected=True):
+# The selection, parenting, visibility and collection helpers below set the
+# data directly instead of going through bpy.ops, so they can be called in
+# loops and take lists of objects.
 
+def ensure_object_mode():
 	if bpy.context.active_object!=None:
 		if bpy.context.active_object.mode!='OBJECT':
 			bpy.ops.object.mode_set(mode='OBJECT')
 
-	bpy.ops.object.select_all(action='DESELECT')
+
+def select_object(theObject,selected=True):
+
+	ensure_object_mode()
+
+	deselect_selected_objects()
 	
 	if selected==True:
 		bpy.context.view_layer.objects.active = theObject
@@ -19,14 +30,40 @@ def select_object(theObject,selected=True):
 		theObject.select_set(state=False)
 
 
+def select_objects(objects,active=None,deselect_others=True):
+
+	ensure_object_mode()
+
+	if deselect_others:
+		deselect_selected_objects()
+
+	for ob in objects:
+		ob.select_set(True)
+
+	if active!=None:
+		bpy.context.view_layer.objects.active = active
+
+
+def deselect_selected_objects():
+	for ob in list(bpy.context.view_layer.objects.selected):
+		ob.select_set(False)
 
 
 def parent_objects_keep_transform(parent,child):
-	bpy.ops.object.select_all(action='DESELECT')
-	parent.select_set(True)
-	child.select_set(True)
-	bpy.context.view_layer.objects.active = parent
-	bpy.ops.object.parent_set(type='OBJECT', keep_transform=True)
+	parent_objects(parent,[child])
+
+
+def parent_objects(parent,children):
+	# same result as parent_set(keep_transform=True):
+	# world = parent.matrix_world @ matrix_parent_inverse @ matrix_basis
+	# singular parent matrices (zero scale) do not raise, like parent_set
+	parent_inverse=parent.matrix_world.inverted_safe()
+
+	for child in children:
+		world=child.matrix_world.copy()
+		child.parent=parent
+		child.matrix_parent_inverse=parent_inverse
+		child.matrix_basis=world
 
 
 def secondsToStr(t):
@@ -44,6 +81,11 @@ def hide_object(ob):
 	ob.hide_viewport = True
 	ob.hide_render = True
 
+def hide_objects(objects,hide=True):
+	for ob in objects:
+		ob.hide_viewport = hide
+		ob.hide_render = hide
+
 def frange(start, stop, step):
 	i = start
 	while i < stop:
@@ -52,11 +94,9 @@ def frange(start, stop, step):
 
 def deselect_all_objects():
 
-	if bpy.context.active_object!=None:
-		if bpy.context.active_object.mode!='OBJECT':
-			bpy.ops.object.mode_set(mode='OBJECT')
+	ensure_object_mode()
 		
-	bpy.ops.object.select_all(action='DESELECT')
+	deselect_selected_objects()
 
 def bmesh_recalculate_normals(obj):
 	mesh=obj.data
@@ -70,11 +110,18 @@ def bmesh_recalculate_normals(obj):
 		
 
 def move_object_to_collection(new_collection,the_object):
+	move_objects_to_collection(new_collection,[the_object])
+
+
+def move_objects_to_collection(new_collection,objects):
 
-	C_collection = find_collection(bpy, the_object)
-	C_collection.objects.unlink(the_object)
+	for ob in objects:
+		for collection in ob.users_collection:
+			if collection!=new_collection:
+				collection.objects.unlink(ob)
 
-	new_collection.objects.link(the_object)
+		if new_collection not in ob.users_collection:
+			new_collection.objects.link(ob)
 
 
 def find_collection(context, item):
@@ -92,12 +139,16 @@ def make_collection(collection_name, parent_collection):
 		bpy.context.scene.collection.children.link(new_collection)
 		return new_collection
 
+def find_collections(item):
+	return list(item.users_collection)
+
+# hidden if the object or all of the collections it is in are hidden
 def is_object_hidden_from_view(the_object):
 	if the_object.hide_viewport==True:
 		return True
 
-	C_collection = find_collection(bpy, the_object)
-	if C_collection.hide_viewport==True:
+	collections = the_object.users_collection
+	if len(collections)>0 and all(c.hide_viewport==True for c in collections):
 		return True
 
 	return False
@@ -123,3 +174,373 @@ class ElapsedTimer:
 
         return elapsed_string
 
+
+class Profiler(ElapsedTimer):
+    """Nested named timing spans with per span counts and totals.
+
+    Spans are recorded while enabled is True, otherwise profile_span costs a
+    single attribute check so spans can stay in production code.
+
+    profiler.enable()
+    with profile_span("calculate_cg"):
+        ...
+    print(profiler.summary())
+    profiler.export_chrome_trace("trace.json")
+    """
+
+    enabled=False
+    max_events=1000000
+
+    def __init__(self):
+        super().__init__()
+        self.reset()
+
+    def enable(self):
+        self.reset()
+        self.enabled=True
+
+    def disable(self):
+        self.enabled=False
+
+    def reset(self):
+        self.start_time=time.time()
+        self.start_ns=time.perf_counter_ns()
+        self.stats={}
+        self.events=[]
+        self.local=threading.local()
+
+    def push(self,name):
+        stack=self.local.__dict__.setdefault("stack",[])
+        path=stack[-1][0]+"/"+name if stack else name
+        stack.append((path,name,time.perf_counter_ns()))
+
+    def pop(self):
+        stack=self.local.__dict__.get("stack")
+        if not stack:
+            return
+
+        end=time.perf_counter_ns()
+        path,name,start=stack.pop()
+
+        stat=self.stats.get(path)
+        if stat is None:
+            stat=self.stats[path]=[0,0]
+        stat[0]+=1
+        stat[1]+=end-start
+
+        if len(self.events)<self.max_events:
+            self.events.append((name,path,start,end,threading.get_ident()))
+
+    def summary(self):
+        """table of span path, call count, total and mean time"""
+
+        lines=["%-60s %8s %12s %12s"%("span","count","total ms","mean ms")]
+
+        for path in sorted(self.stats):
+            count,total=self.stats[path]
+            depth=path.count("/")
+            name="  "*depth+path.rsplit("/",1)[-1]
+            lines.append("%-60s %8d %12.3f %12.3f"%(name,count,total/1e6,total/1e6/count))
+
+        return "\n".join(lines)
+
+    def export_chrome_trace(self,filepath):
+        """write spans as Chrome trace-event JSON (chrome://tracing, Perfetto)"""
+
+        pid=os.getpid()
+        events=[{"name":name, "cat":path, "ph":"X", "pid":pid, "tid":tid,
+                 "ts":(start-self.start_ns)/1000, "dur":(end-start)/1000}
+                for name,path,start,end,tid in self.events]
+
+        with open(filepath,"w") as f:
+            json.dump({"traceEvents":events, "displayTimeUnit":"ms"},f)
+
+
+profiler=Profiler()
+
+
+class profile_span:
+    """named span of the global profiler - use as context manager or decorator
+
+    with profile_span("build"):
+        ...
+
+    @profile_span("measure")
+    def measure(obj):
+        ...
+    """
+
+    __slots__=("name",)
+
+    def __init__(self,name):
+        self.name=name
+
+    def __enter__(self):
+        if profiler.enabled:
+            profiler.push(self.name)
+        return self
+
+    def __exit__(self,exc_type,exc_value,traceback):
+        if profiler.enabled:
+            profiler.pop()
+        return False
+
+    def __call__(self,function):
+        name=self.name
+
+        @functools.wraps(function)
+        def wrapper(*args,**kwargs):
+            if not profiler.enabled:
+                return function(*args,**kwargs)
+
+            profiler.push(name)
+            try:
+                return function(*args,**kwargs)
+            finally:
+                profiler.pop()
+
+        return wrapper
+
+
+class _PrefixNode:
+    __slots__=("children","names")
+
+    def __init__(self):
+        self.children={}
+        self.names=set()
+
+
+class SceneIndex:
+    """Name prefix trie, type map and collection membership of bpy.data.objects.
+
+    Built in one pass on the first query, which also registers the
+    depsgraph handler (see register_scene_index_handler) that re-indexes
+    added, renamed and relinked objects, so queries only visit the matching
+    objects. Removed objects are skipped when a query resolves its names.
+    Without the handler every query syncs with bpy.data.objects first and
+    collection queries read the collection itself.
+
+    scene_index.find(prefix="Bulkhead", type="MESH", visible=True)
+    """
+
+    def __init__(self):
+        self.auto_handler=True
+        self.clear()
+
+    def clear(self):
+        self.root=_PrefixNode()
+        self.types={}
+        self.collections={}
+        self.entries={}
+        self.pointers={}
+        self.built=False
+
+    def build(self):
+        self.clear()
+
+        for ob in bpy.data.objects:
+            self.add(ob)
+
+        self.built=True
+
+        if self.auto_handler:
+            register_scene_index_handler()
+
+    def ensure(self):
+        if not self.built:
+            self.build()
+            return
+
+        # objects added or removed by a script before the next depsgraph
+        # update change the count (removed objects get no update at all)
+        if not is_scene_index_handler_registered() or len(bpy.data.objects)!=len(self.pointers):
+            self.sync()
+
+    def sync(self):
+        """compare with bpy.data.objects, only changed objects are re-indexed"""
+
+        current={ob.as_pointer():ob for ob in bpy.data.objects}
+
+        # removed objects
+        for pointer in [pointer for pointer in self.pointers if pointer not in current]:
+            self.remove(self.pointers[pointer])
+
+        # added or renamed objects
+        for pointer,ob in current.items():
+            if self.pointers.get(pointer)!=ob.name:
+                self.refresh(ob)
+
+    def add(self, ob):
+        name=ob.name
+        collections=tuple(c.name for c in ob.users_collection)
+
+        node=self.root
+        for char in name:
+            node=node.children.setdefault(char,_PrefixNode())
+        node.names.add(name)
+
+        self.types.setdefault(ob.type,set()).add(name)
+        for collection in collections:
+            self.collections.setdefault(collection,set()).add(name)
+
+        self.entries[name]=(ob.type,collections,ob.as_pointer())
+        self.pointers[ob.as_pointer()]=name
+
+    def remove(self, name):
+        entry=self.entries.pop(name,None)
+        if entry is None:
+            return
+
+        ob_type,collections,pointer=entry
+
+        if self.pointers.get(pointer)==name:
+            del self.pointers[pointer]
+
+        node=self.root
+        for char in name:
+            node=node.children.get(char)
+            if node is None:
+                break
+        else:
+            node.names.discard(name)
+
+        self.types.get(ob_type,set()).discard(name)
+        for collection in collections:
+            self.collections.get(collection,set()).discard(name)
+
+    def refresh(self, ob):
+        """re-index one object, handles renames"""
+
+        old_name=self.pointers.get(ob.as_pointer())
+        if old_name is not None:
+            self.remove(old_name)
+
+        self.remove(ob.name)
+        self.add(ob)
+
+    def refresh_collection(self, collection):
+        for ob in collection.all_objects:
+            self.refresh(ob)
+
+    def prefix_names(self, prefix):
+        node=self.root
+        for char in prefix:
+            node=node.children.get(char)
+            if node is None:
+                return set()
+
+        names=set()
+        stack=[node]
+        while stack:
+            node=stack.pop()
+            names.update(node.names)
+            stack.extend(node.children.values())
+
+        return names
+
+    def find(self, prefix=None, type=None, collection=None, visible=None):
+        """objects matching all given filters
+
+        prefix     - name prefix or list of prefixes
+        type       - object type ("MESH", ...)
+        collection - collection or collection name the object is linked to
+        visible    - True/False to filter on is_object_hidden_from_view
+        """
+
+        self.ensure()
+
+        candidates=[]
+
+        if prefix is not None:
+            prefixes=[prefix] if isinstance(prefix,str) else prefix
+            names=set()
+            for p in prefixes:
+                names.update(self.prefix_names(p))
+            candidates.append(names)
+
+        if type is not None:
+            candidates.append(self.types.get(type,set()))
+
+        if collection is not None:
+            if not isinstance(collection,str):
+                collection=collection.name
+
+            if is_scene_index_handler_registered():
+                candidates.append(self.collections.get(collection,set()))
+            else:
+                # membership changes are only seen by the handler
+                found=bpy.data.collections.get(collection)
+                candidates.append(set(ob.name for ob in found.objects) if found is not None else set())
+
+        if candidates:
+            candidates.sort(key=len)
+            names=candidates[0].intersection(*candidates[1:])
+        else:
+            names=self.entries.keys()
+
+        objects=[]
+        for name in sorted(names):
+            ob=bpy.data.objects.get(name)
+
+            if ob is None:
+                continue
+
+            if visible is not None and is_object_hidden_from_view(ob)==visible:
+                continue
+
+            objects.append(ob)
+
+        return objects
+
+
+scene_index=SceneIndex()
+
+
+@bpy.app.handlers.persistent
+def _scene_index_depsgraph_update(scene, depsgraph):
+	if not scene_index.built:
+		return
+
+	for update in depsgraph.updates:
+		data=update.id.original
+
+		if isinstance(data,bpy.types.Object):
+			scene_index.refresh(data)
+		elif isinstance(data,bpy.types.Collection):
+			scene_index.refresh_collection(data)
+
+
+# pointers of the previous file are invalid
+@bpy.app.handlers.persistent
+def _scene_index_load_post(*args):
+	scene_index.clear()
+
+
+def is_scene_index_handler_registered():
+	return _scene_index_depsgraph_update in bpy.app.handlers.depsgraph_update_post
+
+
+def register_scene_index_handler():
+	"""keep scene_index up to date from depsgraph updates, rebuilt after loading a file"""
+
+	scene_index.auto_handler=True
+
+	if _scene_index_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+		bpy.app.handlers.depsgraph_update_post.append(_scene_index_depsgraph_update)
+
+	if _scene_index_load_post not in bpy.app.handlers.load_post:
+		bpy.app.handlers.load_post.append(_scene_index_load_post)
+
+
+def unregister_scene_index_handler():
+
+	# queries sync with bpy.data.objects instead
+	scene_index.auto_handler=False
+
+	if _scene_index_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+		bpy.app.handlers.depsgraph_update_post.remove(_scene_index_depsgraph_update)
+
+	if _scene_index_load_post in bpy.app.handlers.load_post:
+		bpy.app.handlers.load_post.remove(_scene_index_load_post)
+
+	scene_index.clear()
@@ -0,0 +1,152 @@
+# ##### BEGIN GPL LICENSE BLOCK #####
+#
+#  This program is free software; you can redistribute it and/or
+#  modify it under the terms of the GNU General Public License
+#  as published by the Free Software Foundation; either version 2
+#  of the License, or (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program; if not, write to the Free Software Foundation,
+#  Inc., 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+#
+# ##### END GPL LICENSE BLOCK #####
+
+# Minimal streaming ASCII DXF writer (no bpy dependency).
+#
+# Writes a LAYER table followed by 3DFACE and POLYLINE entities as DXF R12
+# (AC1009), which needs no handles, BLOCK_RECORD table or OBJECTS section.
+
+import os
+import re
+import tempfile
+
+import numpy as np
+
+# characters not allowed in DXF layer names
+invalid_layer_characters=re.compile(r'[<>/\\":;?*|=`\s]')
+
+
+def layer_name(name):
+	return invalid_layer_characters.sub("_", name) or "0"
+
+
+class DxfWriter:
+	"""Streams entities to a buffered DXF file.
+
+	with DxfWriter(filepath, layers) as dxf:
+		dxf.write_3dfaces("Keel", corners)
+
+	Entities are formatted chunk_rows at a time. The file is written to a
+	temporary name and only replaces filepath when the block exits without
+	an exception.
+	"""
+
+	def __init__(self, filepath, layers, buffer_size=1<<20, chunk_rows=10000):
+		self.filepath=filepath
+		self.layers=[layer_name(name) for name in layers]
+		self.buffer_size=buffer_size
+		self.chunk_rows=chunk_rows
+		self.entity_count=0
+		self.stream=None
+		self.partial=None
+
+	def __enter__(self):
+		handle,self.partial=tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(self.filepath)), suffix=".dxf")
+		self.stream=open(handle, "w", buffering=self.buffer_size, newline="\n")
+		self.stream.write("0\nSECTION\n2\nHEADER\n9\n$ACADVER\n1\nAC1009\n0\nENDSEC\n")
+		self.write_tables()
+		self.stream.write("0\nSECTION\n2\nENTITIES\n")
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		try:
+			if exc_type is None:
+				self.stream.write("0\nENDSEC\n0\nEOF\n")
+			self.stream.close()
+		finally:
+			self.stream=None
+
+			# a failed export leaves no file behind
+			if exc_type is None:
+				# mkstemp files are private, use the usual permissions
+				umask=os.umask(0)
+				os.umask(umask)
+				os.chmod(self.partial, 0o666 & ~umask)
+
+				os.replace(self.partial, self.filepath)
+			else:
+				os.remove(self.partial)
+
+		return False
+
+	def write_tables(self):
+		write=self.stream.write
+
+		write("0\nSECTION\n2\nTABLES\n0\nTABLE\n2\nLAYER\n70\n%d\n"%len(self.layers))
+
+		for index, name in enumerate(self.layers):
+			# color index cycles through 1..255
+			write("0\nLAYER\n2\n%s\n70\n0\n62\n%d\n6\nCONTINUOUS\n"%(name,index%255+1))
+
+		write("0\nENDTAB\n0\nENDSEC\n")
+
+	def write_3dfaces(self, layer, corners):
+		"""corners is (N,3,3) triangles or (N,4,3) quads in world space"""
+
+		corners=np.asarray(corners, dtype=np.float64)
+
+		if len(corners)==0:
+			return
+
+		# layer names are part of the % template
+		template=("0\n3DFACE\n8\n"+layer_name(layer).replace("%","%%")+"\n"+
+			"".join("1%d\n%%.6f\n2%d\n%%.6f\n3%d\n%%.6f\n"%(i,i,i) for i in range(4)))
+
+		for start in range(0, len(corners), self.chunk_rows):
+			chunk=corners[start:start+self.chunk_rows]
+
+			if chunk.shape[1]==3:
+				# a triangle repeats its last corner
+				chunk=np.concatenate((chunk, chunk[:,2:3]), axis=1)
+
+			self.stream.write("".join(template%tuple(row) for row in chunk.reshape(-1,12).tolist()))
+
+		self.entity_count+=len(corners)
+
+	def write_polylines(self, layer, points, counts):
+		"""closed outlines - points (N,3) in world space, counts points per outline
+
+		2D polylines are planar, points are written as XY with the Z of the
+		first point as elevation.
+		"""
+
+		points=np.asarray(points, dtype=np.float64)
+		layer=layer_name(layer)
+
+		vertex="0\nVERTEX\n8\n"+layer.replace("%","%%")+"\n10\n%.6f\n20\n%.6f\n30\n0.0\n"
+
+		chunks=[]
+		rows=0
+		start=0
+		for count in np.asarray(counts).tolist():
+			outline=points[start:start+count]
+			start+=count
+
+			chunks.append("0\nPOLYLINE\n8\n%s\n66\n1\n10\n0.0\n20\n0.0\n30\n%.6f\n70\n1\n"%(layer,outline[0,2]))
+			chunks.append("".join(vertex%(x,y) for x,y in outline[:,:2].tolist()))
+			chunks.append("0\nSEQEND\n8\n%s\n"%layer)
+
+			rows+=count
+			if rows>=self.chunk_rows:
+				self.stream.write("".join(chunks))
+				chunks=[]
+				rows=0
+
+		self.stream.write("".join(chunks))
+
+		self.entity_count+=len(counts)
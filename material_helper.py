@@ -18,437 +18,638 @@
 
 
 import bpy
+import glob
+import hashlib
+import inspect
+import json
+import os
+import tempfile
+import numpy as np
+
+from ..bpyutils import bpy_helper
+
+# ================================================
+# declarative material specs
+#
+# nodes    - node name, type (omitted for the default Principled BSDF and
+#            Material Output nodes), location, properties, inputs (index ->
+#            default_value) and color ramp elements
+# links    - ((from node, output), (to node, input))
+# clear    - remove all nodes except Material Output first
+# use_nodes - False for materials without a node tree
+# parameters - name -> targets, a target is (node name, input index),
+#            (node name, property), (node name, ("elements", i, property))
+#            or (None, material property)
+# defaults - parameter values of the prototype
+
+principled_color=[("Principled BSDF",0),(None,"diffuse_color")]
+
+material_specs={
+
+	# viewport color only
+	"diffuse":{
+		"use_nodes":False,
+		"parameters":{"color":[(None,"diffuse_color")]},
+		"defaults":{"color":[0.8,0.8,0.8,1]},
+	},
+
+	"subsurf":{
+		"nodes":[
+			{"name":"Principled BSDF", "inputs":{1:1}},
+		],
+		"parameters":{"color":principled_color+[("Principled BSDF",3)]},
+		"defaults":{"color":[0.8,0.8,0.8,1]},
+	},
+
+	"metallic":{
+		"nodes":[
+			# metalic, roughness
+			{"name":"Principled BSDF", "inputs":{4:0.67, 7:0.277}},
+		],
+		"parameters":{"color":principled_color},
+		"defaults":{"color":[0.7,0.7,0.7,1]},
+	},
+
+	"glass":{
+		"clear":True,
+		"nodes":[
+			{"name":"Glossy BSDF", "type":"ShaderNodeBsdfGlossy", "location":(-200,100), "inputs":{1:0}},
+			{"name":"Transparent BSDF", "type":"ShaderNodeBsdfTransparent", "location":(-200,-100)},
+			{"name":"Mix Shader", "type":"ShaderNodeMixShader", "location":(0,0), "inputs":{0:0.776}},
+			{"name":"Material Output", "location":(200,0)},
+		],
+		"links":[
+			(("Glossy BSDF",0),("Mix Shader",1)),
+			(("Transparent BSDF",0),("Mix Shader",2)),
+			(("Mix Shader",0),("Material Output",0)),
+		],
+		"parameters":{"color":[("Glossy BSDF",0)]},
+		"defaults":{"color":[0.7,0.7,0.7,1]},
+	},
+
+	"vertex_color":{
+		"nodes":[
+			{"name":"Vertex Color", "type":"ShaderNodeVertexColor", "location":(0,0)},
+		],
+		"links":[
+			(("Vertex Color",0),("Principled BSDF",0)),
+		],
+	},
+
+	"attribute_ramp":{
+		"nodes":[
+			{"name":"Attribute", "type":"ShaderNodeAttribute", "location":(-600,0)},
+			{"name":"ColorRamp", "type":"ShaderNodeValToRGB", "location":(-350,0)},
+		],
+		"links":[
+			(("Attribute","Fac"),("ColorRamp",0)),
+			(("ColorRamp",0),("Principled BSDF",0)),
+		],
+		"parameters":{
+			"attribute_name":[("Attribute","attribute_name")],
+			"low_color":[("ColorRamp",("elements",0,"color"))],
+			"high_color":[("ColorRamp",("elements",1,"color"))],
+		},
+		"defaults":{"attribute_name":"", "low_color":[0,0,0,1], "high_color":[1,1,1,1]},
+	},
+
+	# subsurf with the +Y half cut away (see disable_cutaway)
+	"hull":{
+		"nodes":[
+			{"name":"Principled BSDF", "location":(100,300), "inputs":{1:1}},
+			{"name":"Texture Coordinate", "type":"ShaderNodeTexCoord", "location":(-600,300)},
+			{"name":"Separate XYZ", "type":"ShaderNodeSeparateXYZ", "location":(-400,300)},
+			{"name":"Math", "type":"ShaderNodeMath", "location":(-200,300),
+				"properties":{"operation":"GREATER_THAN"}, "inputs":{1:0.5}},
+			{"name":"Transparent BSDF", "type":"ShaderNodeBsdfTransparent", "location":(100,-300)},
+			{"name":"Mix Shader", "type":"ShaderNodeMixShader", "location":(450,200)},
+			{"name":"Material Output", "location":(800,0)},
+		],
+		"links":[
+			(("Texture Coordinate",0),("Separate XYZ",0)),
+			(("Separate XYZ",1),("Math",0)),
+			(("Math",0),("Mix Shader",0)),
+			(("Transparent BSDF",0),("Mix Shader",1)),
+			(("Principled BSDF",0),("Mix Shader",2)),
+			(("Mix Shader",0),("Material Output",0)),
+		],
+		"parameters":{"color":principled_color+[("Principled BSDF",3)]},
+		"defaults":{"color":[1,1,1,1]},
+	},
+
+	"aluminum":{
+		"nodes":[
+			{"name":"Texture Coordinate", "type":"ShaderNodeTexCoord", "location":(-400,0)},
+			{"name":"Noise Texture", "type":"ShaderNodeTexNoise", "location":(-200,100),
+				"inputs":{2:40, 3:5}},
+			{"name":"Mapping", "type":"ShaderNodeMapping", "location":(-200,-200),
+				"inputs":{3:(1,1,500)}},
+			{"name":"Musgrave Texture", "type":"ShaderNodeTexMusgrave", "location":(0,-200),
+				"inputs":{2:6, 3:0.3, 4:0, 5:1}},
+			{"name":"bump", "type":"ShaderNodeValToRGB", "location":(200,-150),
+				"elements":[{"position":0.1},{"position":0.3}]},
+			{"name":"ramp2", "type":"ShaderNodeValToRGB", "location":(200,150),
+				"elements":[{"position":0.49, "color":[.41,.41,.41,1]},{"position":0.66, "color":[.51,.51,.51,1]}]},
+			{"name":"roughness", "type":"ShaderNodeMath", "location":(500,-100),
+				"properties":{"operation":"MULTIPLY", "use_clamp":True}, "inputs":{1:1.2}},
+			{"name":"metallic", "type":"ShaderNodeMath", "location":(500,100),
+				"properties":{"operation":"MULTIPLY", "use_clamp":True}, "inputs":{1:2.4}},
+			{"name":"bump.001", "type":"ShaderNodeMath", "location":(500,-300),
+				"properties":{"operation":"MULTIPLY", "use_clamp":True}, "inputs":{1:0.005}},
+			{"name":"Principled BSDF", "location":(1000,200)},
+			{"name":"Material Output", "location":(1300,0)},
+		],
+		"links":[
+			(("Texture Coordinate",3),("Noise Texture",0)),
+			(("Texture Coordinate",0),("Mapping",0)),
+			(("Mapping",0),("Musgrave Texture",0)),
+			(("Musgrave Texture",0),("bump",0)),
+			(("Noise Texture",0),("ramp2",0)),
+			(("ramp2",0),("metallic",0)),
+			(("ramp2",0),("roughness",0)),
+			(("bump",0),("bump.001",0)),
+			(("roughness",0),("Principled BSDF",7)),
+			(("metallic",0),("Principled BSDF",4)),
+			(("ramp2",0),("Principled BSDF",0)),
+			(("bump.001",0),("Material Output",2)),
+		],
+	},
+}
+
+
+def set_material_value(mat,target,value):
+	node_name,key=target
+
+	if node_name is None:
+		setattr(mat,key,value)
+		return
+
+	node=mat.node_tree.nodes[node_name]
+
+	if isinstance(key,int):
+		node.inputs[key].default_value=value
+	elif isinstance(key,tuple):
+		# ("elements", index, property) of a color ramp
+		setattr(node.color_ramp.elements[key[1]],key[2],value)
+	else:
+		setattr(node,key,value)
 
-def make_subsurf_material(name,color):
-	mat = bpy.data.materials.new(name)
-	mat.use_nodes=True
-	tree=mat.node_tree
-	nodes=tree.nodes
 
-	shader_node = nodes['Principled BSDF']
-	#color=[1,0.3,0.3,1] RGBA
-	shader_node.inputs[0].default_value=color
+def set_material_parameters(mat,spec,parameters):
+	targets=spec.get("parameters",{})
 
-	# subsurf
-	shader_node.inputs[1].default_value=1
-	shader_node.inputs[3].default_value=color
+	for name,value in parameters.items():
+		if name not in targets:
+			raise KeyError("Unknown material parameter: %s"%name)
 
-	mat.diffuse_color=shader_node.inputs[0].default_value
-	return mat
+		for target in targets[name]:
+			set_material_value(mat,target,value)
 
 
-def make_glass_material(name,color):
- 
+def build_material(name,spec):
+	"""new material with the node graph of spec"""
+
 	mat = bpy.data.materials.new(name)
-		
+
+	if not spec.get("use_nodes",True):
+		set_material_parameters(mat,spec,spec.get("defaults",{}))
+		return mat
+
 	mat.use_nodes=True
 	tree=mat.node_tree
 	nodes=tree.nodes
-	
-	delete_all_nodes_except_output_material(nodes)
-	
-	links = mat.node_tree.links
+	links=tree.links
 
-	nodeGlossy = nodes.new(type='ShaderNodeBsdfGlossy')
-	nodeGlossy.location=-200,100
-	nodeGlossy.inputs[1].default_value=0
-	nodeGlossy.inputs[0].default_value=color
-	
-	node_transparent = nodes.new(type='ShaderNodeBsdfTransparent')
-	node_transparent.location = -200,-100
-	#node_transparent.inputs[2]=1.01
-
-	node_mix = nodes.new(type='ShaderNodeMixShader')
-	node_mix.location=0,0
-	node_mix.inputs[0].default_value=0.776
-	
-	
-	links.new(nodeGlossy.outputs[0], node_mix.inputs[1])
-	links.new(node_transparent.outputs[0], node_mix.inputs[2])
-	
-	node_output=nodes['Material Output']
-	node_output.location=200,0
-
-	links.new(node_mix.outputs[0], node_output.inputs[0])
+	if spec.get("clear",False):
+		delete_all_nodes_except_output_material(nodes)
 
-	return mat
+	# new nodes may get a suffix so links use the spec names
+	by_name={node.name:node for node in nodes}
 
+	for node_spec in spec.get("nodes",[]):
+		name=node_spec["name"]
 
-def make_vertex_color_material(name):
-	mat = bpy.data.materials.new(name)
-	mat.use_nodes=True
-	tree=mat.node_tree
-	nodes=tree.nodes
-	links = mat.node_tree.links
+		if "type" in node_spec:
+			node=nodes.new(type=node_spec["type"])
+			node.name=name
+			by_name[name]=node
+		else:
+			node=by_name[name]
+
+		if "location" in node_spec:
+			node.location=node_spec["location"]
+
+		# before inputs, operation changes the available sockets
+		for key,value in node_spec.get("properties",{}).items():
+			setattr(node,key,value)
 
-	shader_node = nodes['Principled BSDF']
+		for index,value in node_spec.get("inputs",{}).items():
+			node.inputs[index].default_value=value
 
-	color_node = nodes.new(type='ShaderNodeVertexColor')
-	color_node.location=0,0
+		if "elements" in node_spec:
+			for element,values in zip(node.color_ramp.elements,node_spec["elements"]):
+				for key,value in values.items():
+					setattr(element,key,value)
 
-	links.new(color_node.outputs[0], shader_node.inputs[0])
+	for (from_node,output),(to_node,input) in spec.get("links",[]):
+		links.new(by_name[from_node].outputs[output],by_name[to_node].inputs[input])
+
+	set_material_parameters(mat,spec,spec.get("defaults",{}))
 
 	return mat
 
 
+def is_valid_material(mat):
+	# materials removed from bpy.data raise ReferenceError
+	try:
+		return mat.name is not None
+	except ReferenceError:
+		return False
 
-def make_metalic_material(name,color):
-	mat = bpy.data.materials.new(name)
-	mat.use_nodes=True
-	tree=mat.node_tree
-	nodes=tree.nodes
 
-	shader_node = nodes['Principled BSDF']
-	#color=[1,0.3,0.3,1]
-	shader_node.inputs[0].default_value=color
+class MaterialRegistry:
+	"""Builds each spec once into a prototype and produces materials by copying it
 
-	# metalic
-	shader_node.inputs[4].default_value=0.67
+	registry.get("support","subsurf",color=[0.8,0.3,0.3,1])
+	"""
 
-	# roughness
-	shader_node.inputs[7].default_value=0.277
+	def __init__(self,specs):
+		self.specs=specs
+		self.prototypes={}
+		self.materials={}
 
-	mat.diffuse_color=shader_node.inputs[0].default_value
-	return mat
+	def clear(self):
+		self.prototypes.clear()
+		self.materials.clear()
 
+	def prototype(self,spec_name):
+		mat=self.prototypes.get(spec_name)
 
-def make_diffuse_material(name,color):
-	delete_material(name)
-	new_material = bpy.data.materials.new(name)
-	#print(color)
-	new_material.diffuse_color = color
-	return new_material
+		if mat is None or not is_valid_material(mat):
+			# leading "." hides the prototype in most material lists
+			mat=build_material(".prototype_"+spec_name,self.specs[spec_name])
+			self.prototypes[spec_name]=mat
 
+		return mat
 
-def get_material_vertex_colors():
-	material_name="vertex_colors"
+	def make(self,material_name,spec_name,**parameters):
+		"""new material from the prototype of spec_name"""
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+		mat=self.prototype(spec_name).copy()
+		mat.name=material_name
 
-	return make_vertex_color_material(material_name)
+		set_material_parameters(mat,self.specs[spec_name],parameters)
 
-def get_material_support(): 
-	material_name="support"
+		self.materials[mat.name]=mat
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+		return mat
 
-	return make_subsurf_material(material_name,[0.8,0.3,0.3,1])
+	def get(self,material_name,spec_name,**parameters):
+		"""existing material called material_name, made from spec_name if missing"""
 
-def get_material_stringer(): 
-	material_name="cutter"
+		mat=self.materials.get(material_name)
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+		if mat is not None and is_valid_material(mat) and mat.name==material_name:
+			return mat
 
-	return make_subsurf_material(material_name,[0.2,0.8,0.3,1])
+		mat=bpy.data.materials.get(material_name)
 
+		if mat is None:
+			return self.make(material_name,spec_name,**parameters)
 
-def get_material_bolts(): 
-	material_name="bolts"
+		self.materials[material_name]=mat
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+		return mat
 
-	return make_metalic_material(material_name,[0.7,0.7,0.7,1])
 
-def get_material_window(): 
-	material_name="window"
+material_registry=MaterialRegistry(material_specs)
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+# material name -> (spec name, parameters) of the shared materials
+library_materials={
+	"vertex_colors":("vertex_color",{}),
+	"bend_stress":("attribute_ramp",{"attribute_name":"bend_stress","low_color":[0,0,0,1],"high_color":[1,0,0,1]}),
+	"support":("subsurf",{"color":[0.8,0.3,0.3,1]}),
+	"cutter":("subsurf",{"color":[0.2,0.8,0.3,1]}),
+	"bolts":("metallic",{"color":[0.7,0.7,0.7,1]}),
+	"window":("glass",{"color":[0.7,0.7,0.7,1]}),
+	"default":("diffuse",{"color":[0.8,0.8,0.8,1]}),
+	"water":("subsurf",{"color":[0,0,0.8,0]}),
+	"water_displaced":("subsurf",{"color":[1,0,0.8,0]}),
+	"bulkhead":("subsurf",{"color":[0.5,0.5,0.9,1]}),
+	"keel":("subsurf",{"color":[0.45,0.7,0.9,1]}),
+	"bool":("subsurf",{"color":[1,0.3,0.3,1]}),
+	"fueltank":("subsurf",{"color":[0.6,0.6,0,1]}),
+	"hull":("hull",{}),
+	"aluminum":("aluminum",{}),
+}
 
-	return make_glass_material(material_name,[0.7,0.7,0.7,1])
 
+def get_library_material(material_name):
+	spec_name,parameters=library_materials[material_name]
+	return material_registry.get(material_name,spec_name,**parameters)
 
-def get_material_default():
-	material_name="default"
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+# ================================================
+# prebuilt material library .blend
 
-	return make_diffuse_material(material_name,[0.8,0.8,0.8,1])
 
-def get_material_water():
-	material_name="water"
+# bump when the library changes in a way the hashed code does not show
+LIBRARY_FORMAT_VERSION=1
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+library_file_prefix="bpyutils_materials_"
 
-	return make_subsurf_material(material_name,(0,0,0.8,0))
 
-def get_material_water_displaced():
+def builder_source():
+	"""source of the functions that turn specs into materials"""
 
-	material_name="water_displaced"
+	sources=[]
+	for function in (build_material,set_material_value,set_material_parameters):
+		try:
+			sources.append(inspect.getsource(function))
+		except OSError:
+			# no source available (compiled only)
+			sources.append(function.__code__.co_code.hex())
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+	return sources
 
-	return make_subsurf_material(material_name,(1,0,0.8,0))
 
-def get_material_bulkhead(): 
-	material_name="bulkhead"
+def material_spec_hash():
+	"""changes when the specs, the material table, the builder code or the
+	blender version (socket indices) change"""
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+	data=json.dumps([LIBRARY_FORMAT_VERSION,material_specs,library_materials,
+		builder_source(),bpy.app.version[:2]],sort_keys=True,default=str)
+	return hashlib.sha1(data.encode()).hexdigest()[:12]
 
-	return make_subsurf_material(material_name,[0.5,0.5,0.9,1])
 
+def material_library_path(directory):
+	return os.path.join(directory,"%s%s.blend"%(library_file_prefix,material_spec_hash()))
 
-def get_material_keel(): 
-	material_name="keel"
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+def remove_old_material_libraries(filepath):
+	"""delete the other library files next to filepath"""
 
-	return make_subsurf_material(material_name,[0.45,0.7,0.9,1])
+	pattern=os.path.join(os.path.dirname(os.path.abspath(filepath)),library_file_prefix+"*.blend")
 
+	for path in glob.glob(pattern):
+		if os.path.abspath(path)==os.path.abspath(filepath):
+			continue
 
+		try:
+			os.remove(path)
+		except OSError:
+			# in use or already removed by another session
+			pass
 
-def get_material_bool(): 
-	material_name="bool"
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+def build_material_library(filepath):
+	"""write all library_materials to filepath, built fresh from the specs
 
-	return make_subsurf_material(material_name,[1,0.3,0.3,1])
+	libraries of other spec hashes in the same directory are removed
+	"""
 
-def get_material_fueltank(): 
-	material_name="fueltank"
+	# existing materials of the same name are renamed while building
+	displaced={}
+	for name in library_materials:
+		mat=bpy.data.materials.get(name)
+		if mat is not None:
+			mat.name=name+".displaced"
+			displaced[name]=mat
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+	made=[]
+	try:
+		for name,(spec_name,parameters) in library_materials.items():
+			made.append(material_registry.make(name,spec_name,**parameters))
 
-	return make_subsurf_material(material_name,[0.6,0.6,0,1])	
+		# unique temp file per process, batch workers starting together
+		# may all build the library and replace it atomically
+		handle,partial=tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(filepath)),suffix=".blend")
+		os.close(handle)
 
+		try:
+			bpy.data.libraries.write(partial,set(made),fake_user=True)
 
-def disable_cutaway(mat):
+			# mkstemp files are private, use the usual permissions
+			umask=os.umask(0)
+			os.umask(umask)
+			os.chmod(partial,0o666 & ~umask)
 
-	node_tree=mat.node_tree
-	nodes=node_tree.nodes
-	links = mat.node_tree.links
-		
-	node_mix_shader = nodes['Mix Shader']
+			os.replace(partial,filepath)
+		except Exception:
+			os.remove(partial)
+			raise
 
-	l = node_mix_shader.inputs[0].links[0]
-	node_tree.links.remove(l)
+		remove_old_material_libraries(filepath)
+	finally:
+		for mat in made:
+			bpy.data.materials.remove(mat)
 
-	node_mix_shader.inputs[0].default_value=1
+		for name,mat in displaced.items():
+			mat.name=name
 
+	return filepath
 
-def get_material_hull():
-	material_name="hull"
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
+@bpy_helper.profile_span("material.load_material_library")
+def load_material_library(directory,link=False):
+	"""append (or link) the library materials missing from this file in one load
 
-	mat=make_subsurf_material(material_name,[1,1.0,1.0,1])
-	
-	mat.use_nodes=True
-	tree=mat.node_tree
-	nodes=tree.nodes
-	links = mat.node_tree.links
+	the library in directory is (re)built when the spec hash changed
+	returns the loaded materials
+	"""
 
-	node_principled_bsdf = nodes['Principled BSDF']
-	node_principled_bsdf.location=100,300
+	filepath=material_library_path(directory)
 
+	if not os.path.exists(filepath):
+		os.makedirs(directory,exist_ok=True)
+		build_material_library(filepath)
 
-	node_tex_coord = nodes.new(type='ShaderNodeTexCoord')
-	node_tex_coord.location=-600,300
+	names=[name for name in library_materials if bpy.data.materials.get(name) is None]
 
+	with bpy.data.libraries.load(filepath,link=link) as (data_from,data_to):
+		data_to.materials=[name for name in names if name in data_from.materials]
 
-	node_separateXYZ = nodes.new(type='ShaderNodeSeparateXYZ')
-	node_separateXYZ.location=-400,300
-	
-	links.new(node_tex_coord.outputs[0], node_separateXYZ.inputs[0])
+	loaded=[mat for mat in data_to.materials if mat is not None]
 
-	
-	node_color_math = nodes.new(type='ShaderNodeMath')
-	node_color_math.operation = 'GREATER_THAN'
-	node_color_math.inputs[1].default_value = 0.5
-	node_color_math.location = -200,300
-	
-	links.new(node_separateXYZ.outputs[1], node_color_math.inputs[0])
-	
-	node_transparent = nodes.new(type='ShaderNodeBsdfTransparent')
-	node_transparent.location = 100,-300
+	for mat in loaded:
+		if not link:
+			# saved with a fake user in the library only
+			mat.use_fake_user=False
 
-	node_mix = nodes.new(type='ShaderNodeMixShader')
-	node_mix.location=450,200
-	links.new(node_color_math.outputs[0], node_mix.inputs[0])
-	
-	links.new(node_transparent.outputs[0], node_mix.inputs[1])
-	links.new(node_principled_bsdf.outputs[0], node_mix.inputs[2])
-	
-	node_output=nodes['Material Output']
-	node_output.location=800,0
+		material_registry.materials[mat.name]=mat
 
-	links.new(node_mix.outputs[0], node_output.inputs[0])
+	return loaded
 
-	return mat
 
-def plates_to_aluminum():
-	al_mat = get_aluminum_material()
+def make_subsurf_material(name,color):
+	return material_registry.make(name,"subsurf",color=color)
 
-	list_of_prefix=[ 
-					 "Bulkhead",
-					 "cutterchine",
-					 "hull_object",
-					 "Keel"
-					]
 
-	for o in bpy.data.objects:
-		if o.type=="MESH":
-			for pre in list_of_prefix:
-				if o.name.startswith(pre):
-					assign_material(o,al_mat)
+def make_glass_material(name,color):
+	return material_registry.make(name,"glass",color=color)
 
 
-def get_aluminum_material(): 
-	material_name="aluminum"
+def make_vertex_color_material(name):
+	return material_registry.make(name,"vertex_color")
 
-	if material_name in bpy.data.materials:
-		return bpy.data.materials[material_name]
 
-	return make_aluminum_material(material_name)
+def make_attribute_ramp_material(name,attribute_name,colors):
+	return material_registry.make(name,"attribute_ramp",
+		attribute_name=attribute_name,low_color=colors[0],high_color=colors[1])
 
-def make_aluminum_material(material_name):
 
-	mat = bpy.data.materials.new(material_name)
-		
-	mat.use_nodes=True
-	tree=mat.node_tree
-	nodes=tree.nodes
-	
-	links = mat.node_tree.links
+def make_metalic_material(name,color):
+	return material_registry.make(name,"metallic",color=color)
 
-	xpos=-400
-	xinc=200
 
+def make_diffuse_material(name,color):
+	delete_material(name)
+	new_material = bpy.data.materials.new(name)
+	#print(color)
+	new_material.diffuse_color = color
+	return new_material
 
 
-	node_tex_coord = nodes.new(type='ShaderNodeTexCoord')
-	node_tex_coord.location=xpos,0
+def get_material_vertex_colors():
+	return get_library_material("vertex_colors")
 
-	xpos+=xinc
-	
-	node_tex_noise = nodes.new(type='ShaderNodeTexNoise')
-	node_tex_noise.location=xpos,100
-	node_tex_noise.inputs[2].default_value=40
-	node_tex_noise.inputs[3].default_value=5
+# shared by all objects with a "bend_stress" face attribute (see measure_helper.calculate_bend_stress)
+def get_material_bend_stress():
+	return get_library_material("bend_stress")
 
-	links.new(node_tex_coord.outputs[3], node_tex_noise.inputs[0])
+def get_material_support():
+	return get_library_material("support")
 
-	node_tex_mapping = nodes.new(type='ShaderNodeMapping')
-	node_tex_mapping.location=xpos,-200
-	node_tex_mapping.inputs[3].default_value[2]=500
+def get_material_stringer():
+	return get_library_material("cutter")
 
-	links.new(node_tex_coord.outputs[0], node_tex_mapping.inputs[0])
 
+def get_material_bolts():
+	return get_library_material("bolts")
 
-	xpos+=xinc
+def get_material_window():
+	return get_library_material("window")
 
-	node_tex_musgrave = nodes.new(type='ShaderNodeTexMusgrave')
-	node_tex_musgrave.location=xpos,-200
-	node_tex_musgrave.inputs[2].default_value=6
-	node_tex_musgrave.inputs[3].default_value=0.3
-	node_tex_musgrave.inputs[4].default_value=0
-	node_tex_musgrave.inputs[5].default_value=1
 
+def get_material_default():
+	return get_library_material("default")
 
-	links.new(node_tex_mapping.outputs[0], node_tex_musgrave.inputs[0])
+def get_material_water():
+	return get_library_material("water")
 
-	xpos+=xinc
+def get_material_water_displaced():
+	return get_library_material("water_displaced")
 
-	node_tex_rampbump = nodes.new(type='ShaderNodeValToRGB')
-	node_tex_rampbump.location=xpos,-150
-	node_tex_rampbump.name="bump"
-	node_tex_rampbump.color_ramp.elements[0].position=0.1
-	node_tex_rampbump.color_ramp.elements[1].position=0.3
+def get_material_bulkhead():
+	return get_library_material("bulkhead")
 
-	links.new(node_tex_musgrave.outputs[0], node_tex_rampbump.inputs[0])
 
-	node_tex_ramp2 = nodes.new(type='ShaderNodeValToRGB')
-	node_tex_ramp2.location=xpos,150
-	node_tex_ramp2.name="ramp2"
-	node_tex_ramp2.color_ramp.elements[0].position=0.49
-	node_tex_ramp2.color_ramp.elements[1].position=0.66
+def get_material_keel():
+	return get_library_material("keel")
 
-	node_tex_ramp2.color_ramp.elements[0].color=[.41,.41,.41,1]
-	node_tex_ramp2.color_ramp.elements[1].color=[.51,.51,.51,1]
 
-	links.new(node_tex_noise.outputs[0], node_tex_ramp2.inputs[0])
 
-	xpos+=xinc*1.5
+def get_material_bool():
+	return get_library_material("bool")
 
-	node_tex_math1 = nodes.new(type='ShaderNodeMath')
-	node_tex_math1.location=xpos,-100
-	node_tex_math1.name="roughness"
-	node_tex_math1.operation="MULTIPLY"
-	node_tex_math1.use_clamp=True
-	node_tex_math1.inputs[1].default_value=1.2
-	
+def get_material_fueltank():
+	return get_library_material("fueltank")
 
-	node_tex_math2 = nodes.new(type='ShaderNodeMath')
-	node_tex_math2.location=xpos,100
-	node_tex_math2.name="metallic"
-	node_tex_math2.operation="MULTIPLY"
-	node_tex_math2.use_clamp=True
-	node_tex_math2.inputs[1].default_value=2.4
 
-	node_tex_math3 = nodes.new(type='ShaderNodeMath')
-	node_tex_math3.location=xpos,-300
-	node_tex_math3.name="bump"
-	node_tex_math3.operation="MULTIPLY"
-	node_tex_math3.use_clamp=True
-	node_tex_math3.inputs[1].default_value=0.005
+def disable_cutaway(mat):
 
+	node_tree=mat.node_tree
+	nodes=node_tree.nodes
+	links = mat.node_tree.links
+		
+	node_mix_shader = nodes['Mix Shader']
 
-	xpos+=xinc
+	l = node_mix_shader.inputs[0].links[0]
+	node_tree.links.remove(l)
 
-	links.new(node_tex_ramp2.outputs[0], node_tex_math2.inputs[0])
-	links.new(node_tex_ramp2.outputs[0], node_tex_math1.inputs[0])
+	node_mix_shader.inputs[0].default_value=1
 
-	links.new(node_tex_rampbump.outputs[0], node_tex_math3.inputs[0])
 
-	xpos+=xinc*1.5
+@bpy_helper.profile_span("material.get_material_hull")
+def get_material_hull():
+	return get_library_material("hull")
 
-	node_principled_bsdf = nodes['Principled BSDF']
-	node_principled_bsdf.location=xpos,200
+# name prefixes of the objects made from aluminum plate
+plate_prefixes=[ 
+				 "Bulkhead",
+				 "cutterchine",
+				 "hull_object",
+				 "Keel"
+				]
 
-	links.new(node_tex_math1.outputs[0], node_principled_bsdf.inputs[7])
-	links.new(node_tex_math2.outputs[0], node_principled_bsdf.inputs[4])
+def plates_to_aluminum():
+	al_mat = get_aluminum_material()
 
-	links.new(node_tex_ramp2.outputs[0], node_principled_bsdf.inputs[0])
+	assign_materials(bpy_helper.scene_index.find(prefix=plate_prefixes,type="MESH"),al_mat)
 
 
-	xpos+=xinc*1.5
+def get_aluminum_material():
+	return get_library_material("aluminum")
 
-	node_output=nodes['Material Output']
-	node_output.location=xpos,0
+@bpy_helper.profile_span("material.make_aluminum_material")
+def make_aluminum_material(material_name):
+	return material_registry.make(material_name,"aluminum")
 
-	links.new(node_tex_math3.outputs[0], node_output.inputs[2])
 
+def assign_material(ob,mat):
+	# Assign it to object (1st material slot)
+	assign_materials([ob],mat)
 
 
-	return mat
+def assign_materials(objects,mat,slot=0,face_mask=None):
+	"""Assign mat to material slot of many objects, meshes shared by several objects are written once
 
+	face_mask - optional per face bool array (or dict of object name -> array),
+	the masked faces get material_index=slot
 
-def assign_material(ob,mat):
-	# Assign it to object
-	if ob.data.materials:
-	# assign to 1st material slot
-		ob.data.materials[0] = mat
-	else:
-	# no slots
-		ob.data.materials.append(mat)
+	returns the number of meshes written
+	"""
+
+	# one entry per mesh datablock
+	meshes={}
+	for ob in objects:
+		data=ob.data
+		if data is None or not hasattr(data,"materials"):
+			continue
+		meshes.setdefault(data.as_pointer(),(ob,data))
+
+	for ob,data in meshes.values():
+		materials=data.materials
+
+		# fill empty slots up to slot
+		while len(materials)<=slot:
+			materials.append(None)
+
+		# skip writes that would only tag the mesh for update
+		if materials[slot]!=mat:
+			materials[slot]=mat
+
+		if face_mask is None or not hasattr(data,"polygons"):
+			continue
+
+		mask=face_mask.get(ob.name) if isinstance(face_mask,dict) else face_mask
+		if mask is None:
+			continue
+
+		polygons=data.polygons
+		indices=np.empty(len(polygons),dtype=np.int32)
+		polygons.foreach_get("material_index",indices)
+		indices[np.asarray(mask,dtype=bool)]=slot
+		polygons.foreach_set("material_index",indices)
+		data.update()
+
+	return len(meshes)
 
 
 def delete_material(material_name):
-	for m in bpy.data.materials:
-		if m.name==material_name:
-			bpy.data.materials.remove(m)
+	m=bpy.data.materials.get(material_name)
+	if m is not None:
+		bpy.data.materials.remove(m)
 
 # delete all nodes except output material
 def delete_all_nodes_except_output_material(nodes):
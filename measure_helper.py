@@ -19,12 +19,28 @@
 import bpy
 
 import bmesh
-
+import numpy as np
+
+import csv
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import struct
+import time
+import weakref
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from math import radians, degrees
-from mathutils import Vector
+from mathutils import Vector, Matrix
 
 from ..bpyutils import material_helper
 from ..bpyutils import bpy_helper
+from ..bpyutils import dxf_helper
+
+logger = logging.getLogger(__name__)
 
 bouyancy_text_object=None
 bouyancy_text_object_name="bouyancy_text"
@@ -38,6 +54,9 @@ aluminum_weight=2653
 
 material_weight=aluminum_weight
 
+#hard coded 3mm for now
+material_thickness=0.003
+
 
 # =======================================================================================
 # This bmesh_copy_from_object function was borrowed from the object_print3d_utils addon.
@@ -45,7 +64,7 @@ material_weight=aluminum_weight
 # addons/object_print3d_utils/mesh_helpers.py
 # Credit due to whoever the author is. 
 # =======================================================================================
-def bmesh_copy_from_object(obj, transform=True, triangulate=True, apply_modifiers=False):
+def bmesh_copy_from_object(obj, transform=True, triangulate=True, apply_modifiers=False, session=None):
 	"""
 	Returns a transformed, triangulated copy of the mesh
 	"""
@@ -54,7 +73,10 @@ def bmesh_copy_from_object(obj, transform=True, triangulate=True, apply_modifier
 
 	if apply_modifiers and obj.modifiers:
 		import bpy
-		depsgraph = bpy.context.evaluated_depsgraph_get()
+		if session is not None:
+			depsgraph = session.depsgraph
+		else:
+			depsgraph = bpy.context.evaluated_depsgraph_get()
 		obj_eval = obj.evaluated_get(depsgraph)
 		me = obj_eval.to_mesh()
 		bm = bmesh.new()
@@ -79,15 +101,6 @@ def bmesh_copy_from_object(obj, transform=True, triangulate=True, apply_modifier
 	return bm
 
 
-def measure_object_volume(obj):
-
-	bm = bmesh_copy_from_object(obj, apply_modifiers=True)
-	volume = bm.calc_volume()
-	bm.free()
-
-	return volume
-
-
 # ===============================================
 
 def triangles (verts):
@@ -96,44 +109,605 @@ def triangles (verts):
 		yield (verts[0], verts[i], verts[i+1])
 
 
-def cg_mesh (obj):
-	"""center of mass (and volume) of a mesh"""
+# Evaluated mesh data as numpy arrays:
+# co          - vertex coordinates (N,3) in object local space
+# tris        - loop triangle vertex indices (T,3)
+# tri_poly    - polygon index of each loop triangle (T)
+# poly_select - polygon selection flags (P)
+MeshArrays = namedtuple("MeshArrays", ["co", "tris", "tri_poly", "poly_select"])
+
+
+def mesh_coordinates(mesh):
+	"""vertex coordinates of a mesh as a (N,3) numpy array"""
+
+	co = np.empty(len(mesh.vertices)*3, dtype=np.float32)
+	mesh.vertices.foreach_get("co", co)
+
+	return co.reshape(-1,3).astype(np.float64)
+
+
+def mesh_arrays(mesh):
+	"""vertex coordinates, loop triangles and polygon selection of a mesh as numpy arrays"""
+
+	mesh.calc_loop_triangles()
+
+	co = np.empty(len(mesh.vertices)*3, dtype=np.float32)
+	mesh.vertices.foreach_get("co", co)
+
+	tris = np.empty(len(mesh.loop_triangles)*3, dtype=np.int32)
+	mesh.loop_triangles.foreach_get("vertices", tris)
+
+	tri_poly = np.empty(len(mesh.loop_triangles), dtype=np.int32)
+	mesh.loop_triangles.foreach_get("polygon_index", tri_poly)
+
+	poly_select = np.empty(len(mesh.polygons), dtype=bool)
+	mesh.polygons.foreach_get("select", poly_select)
+
+	return MeshArrays(co.reshape(-1,3).astype(np.float64), tris.reshape(-1,3),
+		tri_poly, poly_select)
+
+
+# Evaluated polygon topology as numpy arrays:
+# loop_total    - loops per polygon (P)
+# loop_verts    - vertex index of each loop (L)
+# loop_edges    - edge index of each loop (L)
+# edge_verts    - vertex indices of each edge (E,2)
+# poly_material - material index of each polygon (P)
+PolygonArrays = namedtuple("PolygonArrays", ["loop_total", "loop_verts", "loop_edges", "edge_verts", "poly_material"])
+
+
+def polygon_arrays(mesh):
+	"""polygon, loop and edge topology of a mesh as numpy arrays"""
+
+	loop_total = np.empty(len(mesh.polygons), dtype=np.int32)
+	mesh.polygons.foreach_get("loop_total", loop_total)
+
+	poly_material = np.empty(len(mesh.polygons), dtype=np.int32)
+	mesh.polygons.foreach_get("material_index", poly_material)
+
+	loop_verts = np.empty(len(mesh.loops), dtype=np.int32)
+	mesh.loops.foreach_get("vertex_index", loop_verts)
+
+	loop_edges = np.empty(len(mesh.loops), dtype=np.int32)
+	mesh.loops.foreach_get("edge_index", loop_edges)
 
-	#We only have to do this once:
-	dg = bpy.context.evaluated_depsgraph_get() #getting the dependency graph
-
-	#This has to be done every time the object updates:
-	ev_ob = obj.evaluated_get(dg) #this gives us the evaluated version of the object. Aka with all modifiers and deformations applied.
-
-
-	center = Vector()
-	volume = 0
-	#mesh = obj.to_mesh ()
-	mesh = ev_ob.to_mesh() #turn it into the mesh data block we want.
-	for face in mesh.polygons:
-		f = face.vertices
-		for t in triangles (f):
-			a,b,c = (mesh.vertices[v].co for v in t)
-			v = a.cross(b).dot(c) / 6
-			center += v * (a+b+c) / 4
-			volume += v
-			
-	#obj.to_mesh_clear()
+	edge_verts = np.empty(len(mesh.edges)*2, dtype=np.int32)
+	mesh.edges.foreach_get("vertices", edge_verts)
+
+	return PolygonArrays(loop_total, loop_verts, loop_edges, edge_verts.reshape(-1,2), poly_material)
+
+
+def evaluated_polygon_arrays(obj, depsgraph=None, session=None):
+	"""PolygonArrays of the evaluated object (modifiers applied), cached by the session if given"""
+
+	if session is not None:
+		return session.polygon_arrays(obj)
+
+	if depsgraph is None:
+		depsgraph = bpy.context.evaluated_depsgraph_get()
+
+	ev_ob = obj.evaluated_get(depsgraph)
+	arrays = polygon_arrays(ev_ob.to_mesh())
+	ev_ob.to_mesh_clear()
+
+	return arrays
+
+
+@bpy_helper.profile_span("measure.evaluated_mesh_arrays")
+def evaluated_mesh_arrays(obj, depsgraph=None, session=None):
+	"""MeshArrays of the evaluated object (modifiers applied), cached by the session if given"""
+
+	if session is not None:
+		return session.arrays(obj)
+
+	if depsgraph is None:
+		depsgraph = bpy.context.evaluated_depsgraph_get()
+
+	ev_ob = obj.evaluated_get(depsgraph)
+	arrays = mesh_arrays(ev_ob.to_mesh())
 	ev_ob.to_mesh_clear()
 
+	return arrays
+
+
+class MeasurementSession:
+	"""Shares one depsgraph and the evaluated mesh arrays of each object
+	between measure calls. The cached arrays are freed on exit.
+
+	with MeasurementSession() as session:
+		area = measure_face_area(obj, True, session=session)
+		cg = cg_mesh(obj, session=session)
+	"""
+
+	def __init__(self, depsgraph=None):
+		self.depsgraph = depsgraph
+		self.shared = {}
+		self._arrays = {}
+		self._polygons = {}
+
+	def __enter__(self):
+		if self.depsgraph is None:
+			self.depsgraph = bpy.context.evaluated_depsgraph_get()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.clear()
+		return False
+
+	def read(self, obj, polygons=False):
+		"""evaluate obj once and cache its MeshArrays, and PolygonArrays if polygons"""
+
+		key = obj.name_full
+
+		if key in self._arrays and (not polygons or key in self._polygons):
+			return
+
+		ev_ob = obj.evaluated_get(self.depsgraph)
+		mesh = ev_ob.to_mesh()
+
+		if key not in self._arrays:
+			self._arrays[key] = mesh_arrays(mesh)
+
+		if polygons and key not in self._polygons:
+			self._polygons[key] = polygon_arrays(mesh)
+
+		ev_ob.to_mesh_clear()
+
+	def arrays(self, obj):
+		self.read(obj)
+		return self._arrays[obj.name_full]
+
+	def polygon_arrays(self, obj):
+		# reads the MeshArrays from the same evaluated mesh
+		self.read(obj, polygons=True)
+		return self._polygons[obj.name_full]
+
+	def clear(self):
+		self._arrays.clear()
+		self._polygons.clear()
+		self.shared.clear()
+
+
+def triangle_areas(co, tris, matrix=None):
+	"""area of each triangle, after transform by matrix if given"""
+
+	a = co[tris[:,0]]
+	normal = np.cross(co[tris[:,1]]-a, co[tris[:,2]]-a)
+
+	if matrix is None:
+		return np.linalg.norm(normal, axis=1) / 2
+
+	# the transformed face normal is n' = cof(M) n = det * M^-T n, the
+	# cofactor matrix also holds for singular M (projected area of flattened parts)
+	linear = np.array(matrix)[:3,:3]
+	x, y, z = linear.T
+	cofactor = np.stack([np.cross(y,z), np.cross(z,x), np.cross(x,y)], axis=1)
+
+	normal = normal @ cofactor.T
+
+	return np.linalg.norm(normal, axis=1) / 2
+
+
+def boundary_edge_lengths(co, polygons, matrix=None, include_loose=False):
+	"""length of each boundary edge (used by a single face), after transform by matrix if given
+
+	polygons is PolygonArrays, with include_loose edges without faces count too.
+	"""
+
+	counts = np.bincount(polygons.loop_edges, minlength=len(polygons.edge_verts))
+
+	if include_loose:
+		edges = polygons.edge_verts[counts < 2]
+	else:
+		edges = polygons.edge_verts[counts == 1]
+
+	vectors = co[edges[:,1]] - co[edges[:,0]]
+
+	if matrix is not None:
+		vectors = vectors @ np.array(matrix)[:3,:3].T
+
+	return np.linalg.norm(vectors, axis=1)
+
+
+def cg_mesh_arrays(co, tris):
+	"""center of mass and volume of a closed triangle mesh given as arrays"""
+
+	a = co[tris[:,0]]
+	b = co[tris[:,1]]
+	c = co[tris[:,2]]
+
+	# signed volume of the tetrahedron each triangle forms with the origin
+	v = np.einsum("ij,ij->i", np.cross(a,b), c) / 6
+	volume = v.sum()
+
+	center = (v[:,None] * (a+b+c)).sum(axis=0) / 4
+
+	if volume != 0:
+		center /= volume
+
+	return center, volume
+
+
+def cg_mesh (obj, session=None):
+	"""center of mass (and volume) of a mesh"""
+
+	if disk_cache is not None:
+		return mass_properties(obj, session=session).volume_centroid
+
+	# evaluated version of the object - with all modifiers and deformations applied.
+	arrays = evaluated_mesh_arrays(obj, session=session)
+	co, tris = arrays.co, arrays.tris
+
+	center, volume = cg_mesh_arrays(co, tris)
+
 	if volume == 0: 
 		#print ("ZERO VOLUME", obj.name)
 		pass
-	else: 
-		center /= volume
 
-	return obj.matrix_world @ center
+	return obj.matrix_world @ Vector(center)
+
+# ================================================
+
+# Mass properties of one evaluated mesh:
+# volume        - enclosed volume (m3)
+# area          - surface area (m2)
+# area_centroid - centroid of the surface
+# volume_centroid - centroid of the enclosed volume
+# inertia       - inertia tensor of the surface about area_centroid per unit
+#                 area density (multiply by thickness*material_weight for KG m2)
+MassProperties = namedtuple("MassProperties",
+	["volume", "area", "area_centroid", "volume_centroid", "inertia"])
+
+
+def mass_properties_arrays(co, tris, matrix=None):
+	"""volume, area, centroids and surface inertia of a triangle mesh given as arrays
+
+	co and tris are in object local space. If matrix is given the results are
+	mapped through it instead of transforming every vertex.
+	"""
+
+	if matrix is None:
+		matrix = np.identity(4)
+
+	linear = matrix[:3,:3]
+	det = np.linalg.det(linear)
+
+	a = co[tris[:,0]]
+	b = co[tris[:,1]]
+	c = co[tris[:,2]]
+	s = a+b+c
+
+	# volume terms - signed tetrahedra against the origin
+	v = np.einsum("ij,ij->i", np.cross(a,b), c) / 6
+	volume = v.sum()
+	volume_centroid = (v[:,None] * s).sum(axis=0) / 4
+
+	if volume != 0:
+		volume_centroid /= volume
+
+	# surface terms - areas corrected from the transformed face normals
+	tri_area = triangle_areas(co, tris, matrix)
+	area = tri_area.sum()
+	area_centroid = (tri_area[:,None] * s).sum(axis=0) / 3
+
+	if area != 0:
+		area_centroid /= area
+
+	# second moment of each triangle: A/12 * (aa' + bb' + cc' + ss')
+	second_moment = (np.einsum("i,ij,ik->jk", tri_area, a, a) +
+		np.einsum("i,ij,ik->jk", tri_area, b, b) +
+		np.einsum("i,ij,ik->jk", tri_area, c, c) +
+		np.einsum("i,ij,ik->jk", tri_area, s, s)) / 12
+
+	# move to the area centroid, then into world orientation
+	second_moment -= area * np.outer(area_centroid, area_centroid)
+	second_moment = linear @ second_moment @ linear.T
+	inertia = np.trace(second_moment) * np.identity(3) - second_moment
+
+	volume_centroid = linear @ volume_centroid + matrix[:3,3]
+	area_centroid = linear @ area_centroid + matrix[:3,3]
+
+	return abs(volume * det), area, area_centroid, volume_centroid, inertia
+
+
+def is_similarity_transform(matrix):
+	"""True if matrix only rotates, mirrors, uniformly scales and translates"""
+
+	linear = np.array(matrix)[:3,:3]
+	gram = linear.T @ linear
+	scale = np.trace(gram) / 3
+
+	return np.allclose(gram, scale * np.identity(3), atol=scale*1e-6)
+
+
+def transform_mass_properties(props, matrix):
+	"""map local MassProperties through a similarity transform (see is_similarity_transform)"""
+
+	matrix = np.array(matrix)
+	linear = matrix[:3,:3]
+	det = np.linalg.det(linear)
+	scale_sq = np.trace(linear.T @ linear) / 3
+
+	# inertia -> second moment, rotate, areas grow by scale^2
+	inertia = np.array(props.inertia)
+	second_moment = np.trace(inertia) / 2 * np.identity(3) - inertia
+	second_moment = scale_sq * (linear @ second_moment @ linear.T)
+	inertia = np.trace(second_moment) * np.identity(3) - second_moment
+
+	return MassProperties(props.volume * abs(det),
+		props.area * scale_sq,
+		Vector(linear @ np.array(props.area_centroid) + matrix[:3,3]),
+		Vector(linear @ np.array(props.volume_centroid) + matrix[:3,3]),
+		Matrix(inertia.tolist()))
+
+
+@bpy_helper.profile_span("measure.mass_properties")
+def mass_properties(obj, depsgraph=None, shared=None, session=None):
+	"""mass properties of the evaluated object in world space from a single mesh evaluation
+
+	The mesh is measured in local space and only the results are transformed.
+	Pass a dict as shared to reuse the measurement between instanced objects
+	that use the same mesh data without modifiers. A session provides both.
+	"""
+
+	if session is not None and shared is None:
+		shared = session.shared
+
+	key = None
+	if shared is not None and not obj.modifiers and obj.data.shape_keys is None:
+		key = obj.data.name_full
+
+	if key is not None and key in shared:
+		co, tris, local_props = shared[key]
+	else:
+		arrays = evaluated_mesh_arrays(obj, depsgraph, session)
+		co, tris = arrays.co, arrays.tris
+
+		local_props = None
+		if key is not None:
+			local_props = _mass_properties_record(_cached_mass_properties_arrays(co, tris))
+			shared[key] = co, tris, local_props
+
+	matrix = np.array(obj.matrix_world)
+
+	if local_props is not None and is_similarity_transform(matrix):
+		return transform_mass_properties(local_props, matrix)
+
+	return _mass_properties_record(_cached_mass_properties_arrays(co, tris, matrix))
+
+
+def _cached_mass_properties_arrays(co, tris, matrix=None):
+	"""mass_properties_arrays through the disk cache when it is enabled"""
+
+	if disk_cache is None:
+		return mass_properties_arrays(co, tris, matrix)
+
+	return disk_cache.mass_properties_arrays(co, tris, matrix)
+
+
+def _mass_properties_record(values):
+	volume, area, area_centroid, volume_centroid, inertia = values
+
+	return MassProperties(volume, area,
+		Vector(area_centroid),
+		Vector(volume_centroid),
+		Matrix(inertia.tolist()))
+
 
 # ================================================
 
+class MassPropertiesDiskCache:
+	"""Persistent SQLite cache of mass properties between Blender sessions.
+
+	Entries are keyed by a hash of the evaluated vertex and triangle buffers,
+	the linear part of matrix_world, material_weight and material_thickness.
+	The least recently used entries are evicted above max_entries.
+	"""
+
+	file_name="mass_properties.sqlite"
+
+	def __init__(self, directory, max_entries=100000):
+		os.makedirs(directory, exist_ok=True)
+
+		self.path = os.path.join(directory, self.file_name)
+		self.max_entries = max_entries
+		self.hits = 0
+		self.misses = 0
+
+		self.connection = sqlite3.connect(self.path, isolation_level=None)
+		self.connection.execute("PRAGMA journal_mode=WAL")
+		self.connection.execute("PRAGMA synchronous=NORMAL")
+		self.connection.execute("CREATE TABLE IF NOT EXISTS mass_properties "
+			"(key TEXT PRIMARY KEY, value BLOB, used REAL)")
+
+		self.entry_count = self.connection.execute(
+			"SELECT COUNT(*) FROM mass_properties").fetchone()[0]
+
+	def key(self, co, tris, linear):
+		h = hashlib.blake2b(digest_size=20)
+		h.update(np.ascontiguousarray(co).tobytes())
+		h.update(np.ascontiguousarray(tris).tobytes())
+		h.update(np.ascontiguousarray(linear, dtype=np.float64).tobytes())
+		h.update(struct.pack("<dd", material_weight, material_thickness))
+		return h.hexdigest()
+
+	def get(self, key):
+		row = self.connection.execute(
+			"SELECT value FROM mass_properties WHERE key=?", (key,)).fetchone()
+
+		if row is None:
+			self.misses += 1
+			return None
+
+		self.hits += 1
+		self.connection.execute(
+			"UPDATE mass_properties SET used=? WHERE key=?", (time.time(), key))
+
+		return np.frombuffer(row[0], dtype=np.float64)
+
+	def put(self, key, value):
+		cursor = self.connection.execute(
+			"INSERT OR IGNORE INTO mass_properties (key, value, used) VALUES (?,?,?)",
+			(key, np.asarray(value, dtype=np.float64).tobytes(), time.time()))
+
+		# the key is a content hash, an existing row already holds the value
+		self.entry_count += cursor.rowcount
+
+		if self.entry_count > self.max_entries:
+			self.evict(self.max_entries * 9 // 10)
+
+	def evict(self, keep):
+		"""drop the least recently used entries until keep remain"""
+
+		# other processes may share the file
+		self.entry_count = self.connection.execute(
+			"SELECT COUNT(*) FROM mass_properties").fetchone()[0]
+
+		self.connection.execute("DELETE FROM mass_properties WHERE key IN "
+			"(SELECT key FROM mass_properties ORDER BY used ASC LIMIT ?)",
+			(max(self.entry_count - keep, 0),))
+
+		self.entry_count = self.connection.execute(
+			"SELECT COUNT(*) FROM mass_properties").fetchone()[0]
+
+	def lookup(self, co, tris, matrix):
+		"""returns (key, packed value or None) for a mesh and its matrix"""
+
+		key = self.key(co, tris, np.array(matrix)[:3,:3])
+
+		return key, self.get(key)
+
+	@staticmethod
+	def linear_part(matrix):
+		# cache results without translation so moved objects still hit
+		linear = np.identity(4)
+		linear[:3,:3] = np.array(matrix)[:3,:3]
+		return linear
+
+	@staticmethod
+	def pack(values):
+		volume, area, area_centroid, volume_centroid, inertia = values
+		return np.concatenate(([volume, area], area_centroid, volume_centroid, inertia.ravel()))
+
+	@staticmethod
+	def unpack(value, matrix):
+		translation = np.array(matrix)[:3,3]
+
+		return (value[0], value[1],
+			value[2:5] + translation,
+			value[5:8] + translation,
+			value[8:17].reshape(3,3))
+
+	def mass_properties_arrays(self, co, tris, matrix=None):
+		"""cached version of the module level mass_properties_arrays"""
+
+		if matrix is None:
+			matrix = np.identity(4)
+
+		key, value = self.lookup(co, tris, matrix)
+
+		if value is None:
+			value = self.pack(mass_properties_arrays(co, tris, self.linear_part(matrix)))
+			self.put(key, value)
+
+		return self.unpack(value, matrix)
+
+	def stats(self):
+		return {"hits": self.hits, "misses": self.misses, "entries": self.entry_count}
+
+	def close(self):
+		self.connection.close()
+
+
+disk_cache=None
+
+
+def enable_disk_cache(directory, max_entries=100000):
+	"""use a persistent mass properties cache in directory"""
+
+	global disk_cache
+
+	disable_disk_cache()
+	disk_cache = MassPropertiesDiskCache(directory, max_entries)
+
+	return disk_cache
+
+
+def disable_disk_cache():
+	global disk_cache
+
+	if disk_cache is not None:
+		logger.info("Mass properties disk cache: %(hits)d hits %(misses)d misses %(entries)d entries", disk_cache.stats())
+		disk_cache.close()
+
+	disk_cache = None
+
+
+@bpy_helper.profile_span("measure.mass_properties_batch")
+def mass_properties_batch(objects, workers=1, session=None):
+	"""MassProperties of many objects, returned in the order of objects
+
+	Mesh arrays are read on the calling thread (bpy is not thread safe) and the
+	numpy kernels run on a pool of worker threads.
+	"""
+
+	if session is None:
+		with MeasurementSession() as session:
+			return mass_properties_batch(objects, workers, session)
+
+	jobs = []
+	for obj in objects:
+		arrays = session.arrays(obj)
+		jobs.append((arrays.co, arrays.tris, np.array(obj.matrix_world)))
+
+	with ThreadPoolExecutor(max_workers=max(workers, 1)) as pool:
+
+		if disk_cache is None:
+			results = list(pool.map(lambda job: mass_properties_arrays(*job), jobs))
+
+		else:
+			# the sqlite connection belongs to this thread - look up and store
+			# here and only compute the misses on the pool
+			lookups = [disk_cache.lookup(*job) for job in jobs]
+
+			futures = [None if value is not None else
+				pool.submit(mass_properties_arrays, co, tris, disk_cache.linear_part(matrix))
+				for (co, tris, matrix), (key, value) in zip(jobs, lookups)]
+
+			results = []
+			for job, (key, value), future in zip(jobs, lookups, futures):
+				if future is not None:
+					value = disk_cache.pack(future.result())
+					disk_cache.put(key, value)
+
+				results.append(disk_cache.unpack(value, job[2]))
+
+	return [_mass_properties_record(values) for values in results]
+
+
+def plate_weight(props):
+	"""weight (KG) of a plate from its MassProperties"""
+
+	# object surface area in m2
+	object_face_area=props.area
+
+	return material_thickness*material_weight*object_face_area
+
+
+def object_weight_and_cg(obj, session=None):
+	"""weight (KG) and CG location of a plate object"""
+
+	# volume, area and CG from one evaluation of the mesh
+	props=mass_properties(obj,session=session)
+
+	return plate_weight(props), props.volume_centroid
+
 
 # returns empty object representing center of gravity location
-def calculate_cg(influence_objects):
+# pass a MassPropertiesCache to only measure objects changed since the last call
+# workers>1 runs the per object measurements on a thread pool
+@bpy_helper.profile_span("measure.calculate_cg")
+def calculate_cg(influence_objects, cache=None, workers=1):
 
 	if influence_objects==None:
 		return None
@@ -157,43 +731,56 @@ def calculate_cg(influence_objects):
 	total_moment=[0,0,0]
 	cg_pos=[0,0,0]
 
-	for obj in influence_objects:
+	start_time=time.perf_counter()
+	debug=logger.isEnabledFor(logging.DEBUG)
 
-		bpy.ops.object.select_all(action='DESELECT')
-		bpy_helper.select_object(obj,True)
-		#bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_MASS', center='MEDIAN')
+	if cache is not None:
+		# modifier and other evaluated changes are only seen by the handler
+		register_mass_cache_handler()
 
-		object_volume=measure_object_volume(obj)
+		for obj in cache.update(influence_objects, workers):
+			assign_weight(obj,cache.entries[obj.name_full].weight)
 
-		object_face_area=measure_face_area(obj,True)
+		total_weight=cache.total_weight
+		total_moment=list(cache.total_moment)
 
-		# object surface area in m2
-		#object_face_area=face_data[1]
+		logger.debug("Changed objects: %d Total weight: %d KG",len(cache.last_changed),total_weight)
 
-		#hard coded 3mm for now
-		material_thickness=0.003
+	else:
+		# one depsgraph for all objects, instanced objects sharing mesh data are measured once
+		with MeasurementSession() as session:
+
+			object_props=None
+			if workers>1:
+				object_props=mass_properties_batch(influence_objects,workers,session)
 
-		object_weight=material_thickness*material_weight*object_face_area
+			for index,obj in enumerate(influence_objects):
 
-		#object_weight=measure_object_volume
+				#bpy.ops.object.origin_set(type='ORIGIN_CENTER_OF_MASS', center='MEDIAN')
 
-		total_weight=total_weight+object_weight
+				if object_props is not None:
+					object_weight=plate_weight(object_props[index])
+					object_cg_location=object_props[index].volume_centroid
+				else:
+					object_weight, object_cg_location = object_weight_and_cg(obj,session)
 
-		print("Object: %s Weight: %f KG Total weight: %d KG"%(obj.name,object_weight,total_weight))
+				#object_weight=measure_object_volume
 
-		object_cg_location=cg_mesh(obj)
+				total_weight=total_weight+object_weight
 
-		# Calculate 3D moment tuple for this influence object
-		object_moment=[	object_weight*object_cg_location.x,
-						object_weight*object_cg_location.y,
-						object_weight*object_cg_location.z ]
+				if debug:
+					logger.debug("Object: %s Weight: %f KG Total weight: %d KG",obj.name,object_weight,total_weight)
 
-		total_moment[0]=total_moment[0]+object_moment[0]
-		total_moment[1]=total_moment[1]+object_moment[1]
-		total_moment[2]=total_moment[2]+object_moment[2]
+				# Calculate 3D moment tuple for this influence object
+				object_moment=[	object_weight*object_cg_location.x,
+								object_weight*object_cg_location.y,
+								object_weight*object_cg_location.z ]
 
-		assign_weight(obj,object_weight)
+				total_moment[0]=total_moment[0]+object_moment[0]
+				total_moment[1]=total_moment[1]+object_moment[1]
+				total_moment[2]=total_moment[2]+object_moment[2]
 
+				assign_weight(obj,object_weight)
 
 
 	if total_weight>0:
@@ -202,7 +789,8 @@ def calculate_cg(influence_objects):
 		cg_pos[1]=total_moment[1]/total_weight
 		cg_pos[2]=total_moment[2]/total_weight
 
-		print("Total weight: %d KG CG: %f %f %f"%(total_weight,cg_pos[0],cg_pos[1],cg_pos[2]))
+		logger.info("Objects: %d Total weight: %d KG CG: %f %f %f (%.3f s)",
+			len(influence_objects),total_weight,cg_pos[0],cg_pos[1],cg_pos[2],time.perf_counter()-start_time)
 
 		
 		cg_empty.location[0]=cg_pos[0]
@@ -210,52 +798,271 @@ def calculate_cg(influence_objects):
 		cg_empty.location[2]=cg_pos[2]
 	else:
 		# prevent divide by zero
-		print("Something went wrong... no total weight calculated")
+		logger.warning("Something went wrong... no total weight calculated")
 
 	assign_weight(cg_empty,total_weight)
+
+	# the last influence object ends up selected and active, as before
+	bpy_helper.select_object(influence_objects[-1],True)
 	
 	return cg_empty
 
-def export_dxf(filename):
 
-	# For some reason it doens't work if there is no material in slot 0
-	# even when you specify entitycolor from obj.layer 
+# ================================================
+
+# Cached result for one object, stamp identifies the state it was measured in
+MassCacheEntry = namedtuple("MassCacheEntry", ["stamp", "weight", "moment", "cg"])
 
-	default_material=material_helper.get_material_default()
 
-	# First make 
-	for obj in bpy.data.objects:
-		if obj.type=="MESH":
-			if len(obj.data.materials)==0:
-				material_helper.assign_material(obj,default_material)
+class MassPropertiesCache:
+	"""Per object weight, moment and CG with running scene totals.
+
+	Objects are only measured again when their change stamp differs from the
+	cached one. The stamp combines a counter bumped by the depsgraph handler
+	(see register_mass_cache_handler) with the mesh data, modifier count,
+	object matrix and element counts. Without the handler a checksum of the
+	mesh coordinates is added, which reads all geometry on every update.
+	The totals are updated by removing the old moment and adding the new.
+
+	Every instance is invalidated by the handler, not only mass_cache.
+	"""
+
+	def __init__(self):
+		mass_caches.add(self)
+
+		self.entries = {}
+		self.mesh_users = {}
+		self.change_counts = {}
+		self.last_changed = []
+		self.total_weight = 0
+		self.total_moment = Vector()
+
+	def stamp(self, obj, checksum=False):
+		mesh = obj.data
+
+		stamp = (self.change_counts.get(obj.name_full, 0), mesh.name_full, len(obj.modifiers),
+			tuple(v for row in obj.matrix_world for v in row), len(mesh.vertices), len(mesh.polygons))
+
+		if not checksum:
+			return stamp
+
+		# catches edits made while the depsgraph handler is not registered
+		co = np.empty(len(mesh.vertices)*3, dtype=np.float32)
+		mesh.vertices.foreach_get("co", co)
+
+		return stamp + (hash(co.tobytes()),)
+
+	def invalidate(self, name):
+		self.change_counts[name] = self.change_counts.get(name, 0) + 1
+
+	def invalidate_mesh(self, mesh_name):
+		for name in self.mesh_users.get(mesh_name, ()):
+			self.invalidate(name)
+
+	def clear(self):
+		self.__init__()
+
+	def update(self, objects, workers=1):
+		"""measure objects that changed, returns the list of changed objects
+
+		with workers>1 the changed objects are measured on a thread pool
+		"""
+
+		names = set()
+		changed = []
+		checksum = not is_mass_cache_handler_registered()
+
+		with MeasurementSession() as session:
+			for obj in objects:
+				name = obj.name_full
+				names.add(name)
+
+				stamp = self.stamp(obj, checksum)
+				entry = self.entries.get(name)
+
+				if entry is not None and entry.stamp == stamp:
+					continue
+
+				changed.append((obj, stamp))
+
+			if workers > 1:
+				props = mass_properties_batch([obj for obj, stamp in changed], workers, session)
+			else:
+				props = [mass_properties(obj, session=session) for obj, stamp in changed]
+
+			for (obj, stamp), obj_props in zip(changed, props):
+				name = obj.name_full
+				weight = plate_weight(obj_props)
+				cg = obj_props.volume_centroid
+
+				self._add(name, MassCacheEntry(stamp, weight, cg * weight, cg))
+				self.mesh_users.setdefault(obj.data.name_full, set()).add(name)
+
+		changed = [obj for obj, stamp in changed]
+
+		# objects no longer part of the set
+		for name in [name for name in self.entries if name not in names]:
+			self._add(name, None)
+
+		self.last_changed = changed
+
+		return changed
+
+	def cg(self):
+		if self.total_weight > 0:
+			return self.total_moment / self.total_weight
+		return None
+
+	def _add(self, name, entry):
+		old = self.entries.pop(name, None)
+
+		if old is not None:
+			self.total_weight -= old.weight
+			self.total_moment -= old.moment
+
+		if entry is not None:
+			self.total_weight += entry.weight
+			self.total_moment += entry.moment
+			self.entries[name] = entry
+
+
+# every live MassPropertiesCache, invalidated by the depsgraph handler
+mass_caches = weakref.WeakSet()
+
+mass_cache = MassPropertiesCache()
+
+
+def _mass_cache_depsgraph_update(scene, depsgraph):
+	for update in depsgraph.updates:
+		if not (update.is_updated_geometry or update.is_updated_transform):
+			continue
 
-			if obj.data.materials[0]==None:
-				material_helper.assign_material(obj,default_material)
+		id = update.id.original
+
+		for cache in list(mass_caches):
+			if isinstance(id, bpy.types.Object):
+				cache.invalidate(id.name_full)
+			elif isinstance(id, bpy.types.Mesh):
+				cache.invalidate_mesh(id.name_full)
+
+
+def is_mass_cache_handler_registered():
+	return _mass_cache_depsgraph_update in bpy.app.handlers.depsgraph_update_post
+
+
+def register_mass_cache_handler():
+	"""invalidate the entries of all MassPropertiesCache objects changed in the depsgraph"""
+
+	if _mass_cache_depsgraph_update not in bpy.app.handlers.depsgraph_update_post:
+		bpy.app.handlers.depsgraph_update_post.append(_mass_cache_depsgraph_update)
+
+
+def unregister_mass_cache_handler():
+
+	if _mass_cache_depsgraph_update in bpy.app.handlers.depsgraph_update_post:
+		bpy.app.handlers.depsgraph_update_post.remove(_mass_cache_depsgraph_update)
+
+	mass_cache.clear()
+
+
+def dxf_layer_names(obj, layer_from):
+	"""DXF layer name of each material slot of obj (one name unless layer_from is 'material')"""
+
+	if layer_from=="material":
+		names=[slot.material.name if slot.material is not None else "0" for slot in obj.material_slots]
+		return names or ["0"]
+
+	if layer_from=="mesh":
+		return [obj.data.name]
+
+	return [obj.name]
+
+
+@bpy_helper.profile_span("measure.export_dxf")
+def export_dxf(filepath="bpyhullgen.dxf", objects=None, layer_from="object", mesh_as="3DFACES"):
+	"""write evaluated meshes to a DXF file without the DXF export add-on
+
+	objects      - MESH objects to export, default the selected ones
+	layer_from   - 'object', 'mesh' or 'material' - one DXF layer per name
+	mesh_as      - '3DFACES' (triangles) or 'POLYLINES' (closed polygon
+	               outlines in XY, for parts laid out flat, 'LWPOLYLINES'
+	               is accepted too)
+	"""
+
+	start_time=time.perf_counter()
+
+	if objects is None:
+		objects=bpy.context.selected_objects
+
+	objects=[obj for obj in objects if obj.type=="MESH"]
+	outlines=mesh_as in ("POLYLINES","LWPOLYLINES")
+
+	layers={}
+	for obj in objects:
+		for name in dxf_layer_names(obj, layer_from):
+			layers.setdefault(name)
 
 	try:
-		bpy.ops.export.dxf(filepath="bpyhullgen.dxf", 
-		projectionThrough='NO', 
-		onlySelected=True, 
-		apply_modifiers=True, 
-		mesh_as='3DFACEs', 
-		entitylayer_from='obj.data.name', 
-		entitycolor_from='obj.layer', 
-		entityltype_from='CONTINUOUS', 
-		layerName_from='LAYERNAME_DEF', 
-		verbose=True)
-	except Exception as e:
-			print("DXF export failed - check export DXF addon is installed?")
-			return False
+		with MeasurementSession() as session, dxf_helper.DxfWriter(filepath, layers) as dxf:
+
+			for obj in objects:
+				names=dxf_layer_names(obj, layer_from)
+
+				# one evaluation for the triangles and polygons
+				session.read(obj, polygons=outlines or len(names)>1)
+				arrays=session.arrays(obj)
+				matrix=np.array(obj.matrix_world)
+				co=arrays.co @ matrix[:3,:3].T + matrix[:3,3]
+
+				if outlines:
+					polygons=session.polygon_arrays(obj)
+					material=np.minimum(polygons.poly_material, len(names)-1)
+					points=co[polygons.loop_verts]
+
+					for index, name in enumerate(names):
+						face_mask=material==index
+						loop_mask=np.repeat(face_mask, polygons.loop_total)
+						dxf.write_polylines(name, points[loop_mask], polygons.loop_total[face_mask])
+				else:
+					corners=co[arrays.tris]
+
+					if len(names)==1:
+						dxf.write_3dfaces(names[0], corners)
+					else:
+						material=np.minimum(session.polygon_arrays(obj).poly_material[arrays.tri_poly], len(names)-1)
+
+						for index, name in enumerate(names):
+							dxf.write_3dfaces(name, corners[material==index])
+
+				# release the arrays of objects already written
+				session.clear()
+
+	except OSError as e:
+		logger.error("DXF export to %s failed: %s", filepath, e)
+		return False
+
+	logger.info("DXF: %s Objects: %d Entities: %d (%.3f s)",
+		filepath,len(objects),dxf.entity_count,time.perf_counter()-start_time)
 
 	return True
 	
 
 
-def measure_object_volume(obj):
+def measure_object_volume(obj, session=None):
 
-	bm = bmesh_copy_from_object(obj, apply_modifiers=True)
-	volume = bm.calc_volume()
-	bm.free()
+	if disk_cache is not None:
+		return mass_properties(obj, session=session).volume
+
+	# measure in local space, volume scales with the determinant
+	if session is not None:
+		arrays = session.arrays(obj)
+		volume = abs(cg_mesh_arrays(arrays.co, arrays.tris)[1])
+	else:
+		bm = bmesh_copy_from_object(obj, transform=False, apply_modifiers=True)
+		volume = bm.calc_volume()
+		bm.free()
+
+	volume = volume * abs(obj.matrix_world.determinant())
 
 	aluminum_weight=volume*material_weight
 
@@ -264,11 +1071,19 @@ def measure_object_volume(obj):
 	return volume
 
 
-def measure_face_count(obj,SelectAll=False):
+def measure_face_count(obj,SelectAll=False,session=None):
+
+	if session is not None:
+		poly_select = session.arrays(obj).poly_select
+
+		if SelectAll==True:
+			return len(poly_select)
+
+		return int(np.count_nonzero(poly_select))
+
 	dg = bpy.context.evaluated_depsgraph_get()
 	bm = bmesh.new()
 	bm.from_object(obj, dg)
-	bm.transform(obj.matrix_world)
 
 	facecount=0
 
@@ -284,25 +1099,42 @@ def measure_face_count(obj,SelectAll=False):
 	return facecount
 
 
-def measure_face_area(obj,SelectAll=False):
+def measure_face_area(obj,SelectAll=False,session=None):
+
+	if disk_cache is not None and SelectAll==True:
+		return mass_properties(obj, session=session).area
+
+	if session is not None:
+		arrays = session.arrays(obj)
+		areas = triangle_areas(arrays.co, arrays.tris, obj.matrix_world)
+
+		if SelectAll==False:
+			areas = areas[arrays.poly_select[arrays.tri_poly]]
+
+		return float(areas.sum())
+
 	dg = bpy.context.evaluated_depsgraph_get()
 	bm = bmesh.new()
 	bm.from_object(obj, dg)
-	bm.transform(obj.matrix_world)
+	bm.normal_update()
+
+	# measure in local space and correct each face area from its
+	# transformed normal: n' = adj(M)^T n = det * M^-T n
+	matrix = obj.matrix_world.to_3x3()
+	normal_matrix = matrix.adjugated().transposed()
 
 	area=0
 
 	if SelectAll==True:
-		area = sum(f.calc_area() for f in bm.faces)
+		area = sum(f.calc_area() * (normal_matrix @ f.normal).length for f in bm.faces)
 	else:
-		area = sum(f.calc_area() for f in bm.faces if f.select)
+		area = sum(f.calc_area() * (normal_matrix @ f.normal).length for f in bm.faces if f.select)
 
 	bm.free()
 	
 	return area
 
 
-
 def assign_weight(obj,weight):
 
 	rna_ui = obj.get('_RNA_UI')
@@ -323,179 +1155,693 @@ def assign_weight(obj,weight):
 
 	obj["weight"]=weight
 
-def scale_to_size(scale_to_size):
+def has_ancestor_in(obj, names):
+	"""True if any parent up the chain of obj is one of names"""
+
+	parent = obj.parent
+	while parent is not None:
+		if parent.name_full in names:
+			return True
+		parent = parent.parent
+
+	return False
+
+
+@bpy_helper.profile_span("measure.scale_objects")
+def scale_objects(objects, scale_factor, pivot=(0,0,0), apply_scale=False):
+	"""uniformly scale objects about a shared pivot by changing matrix_world
+
+	Descendants of scaled objects follow their parent and are not scaled twice.
+	With apply_scale the object scale is baked into the mesh data (like
+	Apply Scale), meshes used by more than one object are left scaled.
+	"""
+
+	pivot = Vector(pivot)
+	scale_matrix = Matrix.Translation(pivot) @ Matrix.Scale(scale_factor,4) @ Matrix.Translation(-pivot)
+
+	objects = list(objects)
+	names = set(obj.name_full for obj in objects)
+
+	for obj in objects:
+		if not has_ancestor_in(obj, names):
+			obj.matrix_world = scale_matrix @ obj.matrix_world
+
+	if not apply_scale:
+		return
+
+	for obj in objects:
+		if obj.type!="MESH":
+			continue
+
+		if obj.data.users>1:
+			logger.warning("%s: mesh %s has multiple users, scale not applied",obj.name,obj.data.name)
+			continue
+
+		scale = np.array(obj.scale)
+
+		me = obj.data
+		co = mesh_coordinates(me) * scale
+		me.vertices.foreach_set("co", co.astype(np.float32).ravel())
+		me.update()
+
+		# keep the children where they are
+		scale_compensation = Matrix.Diagonal(obj.scale).to_4x4()
+		for child in obj.children:
+			child.matrix_parent_inverse = scale_compensation @ child.matrix_parent_inverse
+
+		obj.scale = (1,1,1)
+
+
+def scale_to_size(scale_to_size, pivot=(0,0,0), apply_scale=False):
 
 	distance=get_distance_between_two_selected_points()
-	print("Scale to: %f %f"%(scale_to_size,distance))
 
 	if distance==0:
-		print("Invalid points (Please select 2 points)")
+		logger.warning("Invalid points (Please select 2 points)")
 		return
 
 	scale_factor=1/(distance/scale_to_size)
 
-	print("Distance: %f Scale to: %f Scale factor: %f"%(distance,scale_to_size,scale_factor))
+	logger.info("Distance: %f Scale to: %f Scale factor: %f",distance,scale_to_size,scale_factor)
 
-	bpy.ops.object.mode_set(mode='OBJECT')
+	if apply_scale and bpy.context.active_object!=None:
+		if bpy.context.active_object.mode!='OBJECT':
+			bpy.ops.object.mode_set(mode='OBJECT')
 
-	for obj in bpy.data.objects:
+	scale_objects(bpy_helper.scene_index.find(type="MESH"), scale_factor, pivot, apply_scale)
 
-		if obj.type=="MESH":
-			bpy_helper.select_object(obj,True)
 
-			bpy.ops.transform.resize(value=(scale_factor,scale_factor,scale_factor))
+# Selection of a mesh object in world space:
+# count     - number of selected vertices
+# centroid  - mean of the selected vertices
+# minimum   - lower corner of their bounding box
+# maximum   - upper corner of their bounding box
+# distances - (count,count) pairwise distances, None above max_pairwise vertices
+SelectionStats = namedtuple("SelectionStats", ["count", "centroid", "minimum", "maximum", "distances"])
+
+
+def selected_vertex_coordinates(obj):
+	"""world space coordinates of the selected vertices as a (N,3) numpy array
+
+	Reads the select flags and coordinates in bulk, in edit mode after syncing
+	the edit mesh with update_from_editmode - the mode is never changed.
+	"""
+
+	if obj.mode=='EDIT':
+		obj.update_from_editmode()
+
+	me = obj.data
+
+	select = np.empty(len(me.vertices), dtype=bool)
+	me.vertices.foreach_get("select", select)
+
+	co = mesh_coordinates(me)[select]
+
+	matrix = np.array(obj.matrix_world)
+
+	return co @ matrix[:3,:3].T + matrix[:3,3]
+
+
+def selection_stats(obj, max_pairwise=2000):
+	"""SelectionStats of the selected vertices of obj"""
+
+	co = selected_vertex_coordinates(obj)
+
+	if len(co)==0:
+		return SelectionStats(0, None, None, None, None)
+
+	distances = None
+	if len(co) <= max_pairwise:
+		distances = np.linalg.norm(co[:,None,:] - co[None,:,:], axis=2)
+
+	return SelectionStats(len(co), co.mean(axis=0), co.min(axis=0), co.max(axis=0), distances)
 
 
 # Gets the distance between two selected vertices on selected object
-# Assumes you are in edit mode and have only 2 vertices selected
+# Expects only 2 vertices selected, works in object and edit mode
 def get_distance_between_two_selected_points():
 
 	obj = bpy.context.object
 	
-	selected_vertices=[]
-	
 	if obj==None:
-		print("No Object Selected")
+		logger.warning("No Object Selected")
 		return 0
 	
-	# cycle between edit mode and object mode to ensure selections are propogated
-	# from temporary copy
-	bpy.ops.object.mode_set(mode='OBJECT')
-	bpy.ops.object.mode_set(mode='EDIT')
-
-
-	for v in bpy.context.active_object.data.vertices:
-		if v.select:
-			print(str(v.select))
-			co_final =  obj.matrix_world @ v.co
-			print(co_final)
-			selected_vertices.append(co_final)
-			
-	print(len(selected_vertices))
+	selected_vertices=selected_vertex_coordinates(obj)
+
+	logger.debug("Selected vertices: %d",len(selected_vertices))
 		
-	if len(selected_vertices)>2:
-		print("Please select only 2 vertices")
+	if len(selected_vertices)!=2:
+		logger.warning("Please select only 2 vertices")
 		return 0
 	
-	distance=(selected_vertices[0]-selected_vertices[1]).length
+	distance=float(np.linalg.norm(selected_vertices[0]-selected_vertices[1]))
 
 	return distance
 		
 
-def measure_selected_edges():
+def measure_selected_edges(objects=None):
+	"""total length of the open edges (used by fewer than two faces) of the selected mesh objects
+
+	Works from the mesh arrays in any mode and measures in world units, so
+	object scale does not have to be applied first. Edit mode changes are
+	read with update_from_editmode instead of switching modes.
+	"""
 
 	total_length=0
 	objects_counted=0
 
 	# Code borrowed from Measure Tools - Credit to: Chris Kohl
 
-	# Must apply scale transform otherwise the measurement will be wrong.
-	# However, you could probably calculate the scale delta(?) and adjust the numbers as needed
-	# without forcibly applying scale (If you were smarter than me)
-	#bpy.ops.object.transform_apply(location=False, rotation=False, scale=True)
-
-
-	sel = bpy.context.selected_objects
+	sel = objects if objects is not None else bpy.context.selected_objects
 
 	if len(sel)<1:
 		return 0
 
-	# Measurement has to be done in edit mode.
-	bpy.ops.object.mode_set(mode='EDIT')
+	start_time=time.perf_counter()
+	edges_scanned=0
 
 	for obj in sel:
 		if obj.type=="MESH":
+			if obj.mode=='EDIT':
+				obj.update_from_editmode()
+
 			me = obj.data
-			bm = bmesh.from_edit_mesh(me)
-			
-			object_edges = [e for e in bm.edges]
-			
-			perimeter_length = 0.0
-			for e in object_edges:
-				
-				print("Link Faces %s"%e.link_faces)
-				if len(e.link_faces) < 2:
-					# Measure length of e with calc_length
-					perimeter_length = perimeter_length + e.calc_length()
-				elif len(e.link_faces) > 1:
-					bpy.ops.object.mode_set(mode='OBJECT')
-					print("%s: Connected faces detected in selection.  Only works with stand-alone loops of edges or single unconnected faces and n-gons."%obj.name)
-					return 0
-
-
-			print("%03d: '%s' length: %f"%(objects_counted,obj.name,perimeter_length) )
+			polygons = polygon_arrays(me)
+
+			lengths = boundary_edge_lengths(mesh_coordinates(me), polygons, obj.matrix_world, include_loose=True)
+			perimeter_length = float(lengths.sum())
+
+			edges_scanned+=len(polygons.edge_verts)
+
+			logger.info("%03d: '%s' edges: %d length: %f",objects_counted,obj.name,len(lengths),perimeter_length)
 
 			total_length+=perimeter_length
 			objects_counted+=1
 
-	bpy.ops.object.mode_set(mode='OBJECT')
+	logger.info("Objects: %d Edges scanned: %d Length: %f (%.3f s)",
+		objects_counted,edges_scanned,total_length,time.perf_counter()-start_time)
 
 	return total_length
 	
 
-def calculate_bend_stress(obj):
+# ================================================
+
+cut_list_fields=["part","quantity","objects","area","perimeter","weight","total_weight","size_x","size_y","size_z"]
+
+
+def part_hash(arrays, matrix):
+	"""hash of the evaluated geometry and object scale - equal for identical parts
+
+	Rotation and location are left out (L.T @ L of the linear part), the sign
+	of the determinant keeps mirrored parts apart.
+	"""
+
+	linear = np.array(matrix)[:3,:3]
+	# rounded, rotated copies differ in the last bits
+	gram = np.round(linear.T @ linear, 9) + 0.0
+
+	h = hashlib.blake2b(digest_size=16)
+	h.update(np.ascontiguousarray(arrays.co).tobytes())
+	h.update(np.ascontiguousarray(arrays.tris).tobytes())
+	h.update(np.ascontiguousarray(gram, dtype=np.float64).tobytes())
+	h.update(b"-" if np.linalg.det(linear) < 0 else b"+")
+	return h.hexdigest()
+
+
+@bpy_helper.profile_span("measure.cut_list")
+def cut_list(objects=None, collection=None, filepath=None, format="csv"):
+	"""area, cut perimeter, weight and bounding box of every plate
+
+	Parts with identical geometry and scale are measured once and reported
+	with a quantity, whatever their location and rotation. The size is the
+	bounding box in the scaled local axes of the part. objects defaults to the MESH objects of collection (a
+	collection or its name) or the selected objects. Returns the rows and
+	writes them as CSV or JSON to filepath if given.
+	"""
+
+	start_time=time.perf_counter()
+
+	if objects is None:
+		if collection is not None:
+			if isinstance(collection, str):
+				collection=bpy.data.collections[collection]
+			objects=collection.all_objects
+		else:
+			objects=bpy.context.selected_objects
+
+	objects=[obj for obj in objects if obj.type=="MESH"]
+
+	parts={}
+
+	with MeasurementSession() as session:
+		for obj in objects:
+			# one evaluation for the triangles and polygons
+			session.read(obj, polygons=True)
+			arrays=session.arrays(obj)
+			matrix=np.array(obj.matrix_world)
+
+			key=part_hash(arrays, matrix)
+			part=parts.get(key)
+
+			if part is not None:
+				part["quantity"]+=1
+				part["objects"].append(obj.name)
+				continue
+
+			props=mass_properties(obj, session=session)
+			perimeter=boundary_edge_lengths(arrays.co, session.polygon_arrays(obj), matrix).sum()
+
+			# part size along its own axes, independent of placement
+			co=arrays.co * np.linalg.norm(matrix[:3,:3], axis=0)
+			size=co.max(axis=0)-co.min(axis=0) if len(co) else np.zeros(3)
+
+			parts[key]={"part":obj.name, "quantity":1, "objects":[obj.name],
+				"area":props.area, "perimeter":float(perimeter), "weight":plate_weight(props),
+				"size_x":float(size[0]), "size_y":float(size[1]), "size_z":float(size[2])}
+
+			# geometry of measured parts is no longer needed
+			session.clear()
+
+	rows=[]
+	for part in parts.values():
+		row=dict(part)
+		row["total_weight"]=row["weight"]*row["quantity"]
+		row["objects"]=";".join(row["objects"])
+		rows.append(row)
+
+	if filepath is not None:
+		with open(filepath, "w", newline="") as f:
+			if format=="json":
+				json.dump(rows, f, indent=1)
+			else:
+				writer=csv.DictWriter(f, fieldnames=cut_list_fields)
+				writer.writeheader()
+				writer.writerows(rows)
+
+	logger.info("Cut list: %d objects %d parts Total weight: %f KG (%.3f s)",
+		len(objects),len(rows),sum(row["total_weight"] for row in rows),time.perf_counter()-start_time)
+
+	return rows
+
+
+# ================================================
+
+# Developability of a plate (can it be rolled from flat sheet):
+# area             - surface area (m2)
+# total_curvature  - integrated Gaussian curvature, sum of interior angle defects (radians)
+# max_defect       - largest absolute interior angle defect (radians)
+# max_curvature    - largest absolute Gaussian curvature density (1/m2)
+# curved_fraction  - fraction of interior vertices with defect above tolerance
+# developable      - True if no interior vertex exceeds tolerance
+Developability = namedtuple("Developability",
+	["area", "total_curvature", "max_defect", "max_curvature", "curved_fraction", "developable"])
+
+
+def angle_defect_arrays(co, tris):
+	"""per vertex angle defect, vertex area and interior flag of a triangle mesh
+
+	The angle defect of an interior vertex is 2pi minus the sum of the corner
+	angles around it, which is the Gaussian curvature integrated over the
+	vertex area (a third of the adjacent triangles).
+	"""
+
+	vertex_count = len(co)
+	corners = tris.ravel()
+
+	a = co[tris[:,0]]
+	b = co[tris[:,1]]
+	c = co[tris[:,2]]
+
+	cross = np.cross(b-a, c-a)
+	double_area = np.linalg.norm(cross, axis=1)
+
+	# corner angle at each vertex of each triangle: atan2(|u x v|, u.v)
+	def corner_angle(u, v):
+		return np.arctan2(double_area, np.einsum("ij,ij->i", u, v))
+
+	angles = np.stack((corner_angle(b-a, c-a), corner_angle(c-b, a-b), corner_angle(a-c, b-c)), axis=1)
+
+	angle_sum = np.bincount(corners, weights=angles.ravel(), minlength=vertex_count)
+	vertex_area = np.bincount(corners, weights=np.repeat(double_area/6, 3), minlength=vertex_count)
+	used = np.bincount(corners, minlength=vertex_count) > 0
+
+	# boundary vertices are on edges used by a single triangle
+	edges = np.sort(np.stack((tris, np.roll(tris, -1, axis=1)), axis=2).reshape(-1,2), axis=1)
+	keys = edges[:,0].astype(np.int64)*vertex_count + edges[:,1]
+	unique_keys, counts = np.unique(keys, return_counts=True)
+	boundary_keys = unique_keys[counts == 1]
+
+	interior = used.copy()
+	interior[boundary_keys // vertex_count] = False
+	interior[boundary_keys % vertex_count] = False
+
+	defect = np.where(interior, 2*np.pi - angle_sum, 0)
+
+	return defect, vertex_area, interior
+
+
+@bpy_helper.profile_span("measure.measure_developability")
+def measure_developability(obj, tolerance=0.001, write_attribute=False, session=None):
+	"""angle defect / Gaussian curvature summary of a plate object
+
+	tolerance is the largest interior angle defect (radians) still treated as
+	flat or single curved. With write_attribute the per vertex Gaussian
+	curvature density (angle defect / vertex area, 1/m2, negative on saddles)
+	is stored in a "gaussian_curvature" POINT attribute for display.
+	"""
+
+	arrays = evaluated_mesh_arrays(obj, session=session)
+
+	matrix = np.array(obj.matrix_world)
+	co = arrays.co @ matrix[:3,:3].T
+
+	defect, vertex_area, interior = angle_defect_arrays(co, arrays.tris)
+
+	interior_count = np.count_nonzero(interior)
+	abs_defect = np.abs(defect)
+
+	curvature = np.zeros(len(defect))
+	np.divide(abs_defect, vertex_area, out=curvature, where=vertex_area > 0)
+
+	result = Developability(vertex_area.sum(),
+		defect.sum(),
+		abs_defect.max() if len(defect) else 0,
+		curvature.max() if len(defect) else 0,
+		np.count_nonzero(abs_defect > tolerance) / interior_count if interior_count else 0,
+		not np.any(abs_defect > tolerance))
+
+	if write_attribute:
+		me = obj.data
+
+		if len(me.vertices) != len(defect):
+			logger.warning("%s: modifiers change the vertex count, gaussian_curvature not written", obj.name)
+		else:
+			attribute = me.attributes.get("gaussian_curvature")
+			if attribute is not None and (attribute.domain != 'POINT' or attribute.data_type != 'FLOAT'):
+				me.attributes.remove(attribute)
+				attribute = None
+
+			if attribute is None:
+				attribute = me.attributes.new("gaussian_curvature", 'FLOAT', 'POINT')
+
+			density = np.zeros(len(defect))
+			np.divide(defect, vertex_area, out=density, where=vertex_area > 0)
+
+			attribute.data.foreach_set("value", density.astype(np.float32))
+			me.update()
+
+	return result
+
+
+def plates_developability(objects=None, tolerance=0.001, write_attribute=False):
+	"""Developability of every plate, by default the MESH objects matching material_helper.plate_prefixes"""
+
+	start_time=time.perf_counter()
+
+	if objects is None:
+		objects = bpy_helper.scene_index.find(prefix=material_helper.plate_prefixes, type="MESH")
+
+	results = {}
+
+	with MeasurementSession() as session:
+		for obj in objects:
+			results[obj.name] = measure_developability(obj, tolerance, write_attribute, session)
+
+	compound = [name for name, result in results.items() if not result.developable]
+
+	logger.info("Plates: %d Compound curved: %d (%.3f s)", len(results), len(compound), time.perf_counter()-start_time)
+
+	return results
+
+
+def edge_face_pairs(loop_edges, loop_poly):
+	"""(faces, edges) of the manifold edges - the two faces sharing each edge with exactly two faces"""
+
+	order = np.argsort(loop_edges, kind="stable")
+	sorted_edges = loop_edges[order]
+
+	counts = np.bincount(loop_edges)
+	starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+
+	manifold = np.flatnonzero(counts == 2)
+	first = order[starts[manifold]]
+	second = order[starts[manifold]+1]
+
+	return np.stack((loop_poly[first], loop_poly[second]), axis=1), manifold
+
+
+class BendStressState:
+	"""Per face bend angles of one mesh with the arrays needed to update them.
+
+	update() compares the vertex coordinates with the previous run and only
+	recomputes the normals of faces around moved vertices, the dihedral angles
+	of their edges and the maximum of those faces and their one-ring
+	neighbours.
+	"""
+
+	def __init__(self, me):
+		poly_count = len(me.polygons)
+
+		self.topology = self.topology_key(me)
+
+		self.loop_total = np.empty(poly_count, dtype=np.int32)
+		me.polygons.foreach_get("loop_total", self.loop_total)
+
+		self.loop_verts = np.empty(len(me.loops), dtype=np.int32)
+		me.loops.foreach_get("vertex_index", self.loop_verts)
+
+		loop_edges = np.empty(len(me.loops), dtype=np.int32)
+		me.loops.foreach_get("edge_index", loop_edges)
+
+		self.loop_poly = np.repeat(np.arange(poly_count, dtype=np.int32), self.loop_total)
+
+		# next loop around the same face
+		loop_start = np.cumsum(self.loop_total) - self.loop_total
+		self.loop_next = np.arange(len(me.loops), dtype=np.int32) + 1
+		self.loop_next[loop_start+self.loop_total-1] = loop_start
+
+		self.edge_faces, self.edges = edge_face_pairs(loop_edges, self.loop_poly)
+
+		self.co = self.read_co(me)
+
+		normals = np.empty(poly_count*3, dtype=np.float32)
+		me.polygons.foreach_get("normal", normals)
+		self.normals = normals.reshape(-1,3).astype(np.float64)
+
+		self.angles = self.edge_angles(np.arange(len(self.edge_faces)))
+
+		self.face_max = np.zeros(poly_count)
+		np.maximum.at(self.face_max, self.edge_faces[:,0], self.angles)
+		np.maximum.at(self.face_max, self.edge_faces[:,1], self.angles)
+
+		self.min_angle = self.face_max.min() if poly_count else 0
+		self.max_angle = self.face_max.max() if poly_count else 0
+		self.values = bend_color_values(self.face_max, self.min_angle, self.max_angle)
+
+	@staticmethod
+	def topology_key(me):
+		# the pointer changes when obj.data is swapped for another mesh
+		return (me.as_pointer(), len(me.vertices), len(me.edges), len(me.loops), len(me.polygons))
+
+	def matches(self, me):
+		"""True if me still has the topology the arrays were built from"""
+
+		if self.topology != self.topology_key(me):
+			return False
+
+		# same counts but different connectivity (rotate edge, ...)
+		loop_verts = np.empty(len(me.loops), dtype=np.int32)
+		me.loops.foreach_get("vertex_index", loop_verts)
+
+		return np.array_equal(loop_verts, self.loop_verts)
+
+	@staticmethod
+	def read_co(me):
+		co = np.empty(len(me.vertices)*3, dtype=np.float32)
+		me.vertices.foreach_get("co", co)
+		return co.reshape(-1,3)
+
+	def edge_angles(self, edge_ids):
+		# angle between the normals of the two faces - once per edge
+		faces = self.edge_faces[edge_ids]
+		dot = np.einsum("ij,ij->i", self.normals[faces[:,0]], self.normals[faces[:,1]])
+		return np.degrees(np.arccos(np.clip(dot, -1, 1)))
+
+	def update_normals(self, faces):
+		# Newell normal of the given faces from their loops only
+		face_mask = np.zeros(len(self.loop_total), dtype=bool)
+		face_mask[faces] = True
+
+		loops = np.flatnonzero(face_mask[self.loop_poly])
+		p = self.co[self.loop_verts[loops]].astype(np.float64)
+		q = self.co[self.loop_verts[self.loop_next[loops]]].astype(np.float64)
+
+		normals = np.zeros((len(faces),3))
+		np.add.at(normals, np.searchsorted(faces, self.loop_poly[loops]), np.cross(p,q))
+
+		length = np.linalg.norm(normals, axis=1)
+		length[length == 0] = 1
+
+		self.normals[faces] = normals / length[:,None]
+
+	def update(self, me):
+		"""recompute around moved vertices, returns the number of faces changed"""
+
+		co = self.read_co(me)
+		moved = np.any(co != self.co, axis=1)
+
+		if not moved.any():
+			return 0
+
+		self.co = co
+
+		moved_faces = np.unique(self.loop_poly[moved[self.loop_verts]])
+		self.update_normals(moved_faces)
+
+		moved_mask = np.zeros(len(self.loop_total), dtype=bool)
+		moved_mask[moved_faces] = True
+
+		# edges of the moved faces change angle, which changes the maximum of
+		# the faces on both sides of them (the one-ring neighbours)
+		changed_edges = np.flatnonzero(moved_mask[self.edge_faces].any(axis=1))
+		self.angles[changed_edges] = self.edge_angles(changed_edges)
+
+		changed_faces = np.unique(self.edge_faces[changed_edges])
+		changed_mask = np.zeros(len(self.loop_total), dtype=bool)
+		changed_mask[changed_faces] = True
+
+		old_max = self.face_max[changed_faces]
+
+		edges = np.flatnonzero(changed_mask[self.edge_faces].any(axis=1))
+		self.face_max[changed_faces] = 0
+		for side in (0,1):
+			faces = self.edge_faces[edges,side]
+			keep = changed_mask[faces]
+			np.maximum.at(self.face_max, faces[keep], self.angles[edges[keep]])
+
+		new_max = self.face_max[changed_faces]
+
+		# only rescan for an extreme when the face holding it changed
+		min_angle, max_angle = self.min_angle, self.max_angle
+
+		if np.any((old_max == max_angle) & (new_max < max_angle)):
+			max_angle = self.face_max.max()
+		elif len(new_max):
+			max_angle = max(max_angle, new_max.max())
+
+		if np.any((old_max == min_angle) & (new_max > min_angle)):
+			min_angle = self.face_max.min()
+		elif len(new_max):
+			min_angle = min(min_angle, new_max.min())
+
+		if (min_angle, max_angle) != (self.min_angle, self.max_angle):
+			self.min_angle, self.max_angle = min_angle, max_angle
+			self.values = bend_color_values(self.face_max, min_angle, max_angle)
+		else:
+			self.values[changed_faces] = bend_color_values(new_max, min_angle, max_angle)
+
+		return len(changed_faces)
+
+
+# BendStressState of objects run with calculate_bend_stress(incremental=True)
+bend_stress_states = {}
+
+
+def bend_color_values(face_max, min_max_angle, max_max_angle):
+	"""face bend angles normalized to 0..1 between the smallest and largest"""
+
+	bend_diff = max_max_angle-min_max_angle
+
+	if bend_diff > 0:
+		return (face_max-min_max_angle) / bend_diff
+
+	return np.zeros(len(face_max))
+
+
+def write_face_attribute(me, face_values, attribute_name="bend_stress"):
+	"""write face_values as a single float per face in one foreach_set"""
+
+	attribute = me.attributes.get(attribute_name)
+	if attribute is not None and (attribute.domain != 'FACE' or attribute.data_type != 'FLOAT'):
+		me.attributes.remove(attribute)
+		attribute = None
+
+	if attribute is None:
+		attribute = me.attributes.new(attribute_name, 'FLOAT', 'FACE')
+
+	attribute.data.foreach_set("value", np.asarray(face_values, dtype=np.float32))
+
+
+def write_face_colors(me, loop_total, face_values, layer_name="color"):
+	"""write face_values as the red channel of a loop color layer in one foreach_set"""
+
+	color_layer = me.vertex_colors.get(layer_name)
+	if color_layer is None:
+		color_layer = me.vertex_colors.new(name=layer_name)
+
+	rgba = np.zeros((len(face_values),4), dtype=np.float32)
+	rgba[:,0] = face_values
+	rgba[:,3] = 1
+
+	color_layer.data.foreach_set("color", np.repeat(rgba, loop_total, axis=0).ravel())
+
+
+@bpy_helper.profile_span("measure.calculate_bend_stress")
+def calculate_bend_stress(obj, use_attribute=False, incremental=False):
+	"""color each face by the largest angle to its neighbours (manifold edges)
+
+	By default the value is written to every loop of the "color" layer. With
+	use_attribute it is stored once per face in a "bend_stress" float
+	attribute and shown through the shared bend_stress material.
+
+	With incremental the arrays of the previous incremental run of this object
+	are kept and only the region around moved vertices is recomputed.
+	"""
+
+	start_time=time.perf_counter()
+	debug=logger.isEnabledFor(logging.DEBUG)
 
 	me=obj.data
-	bm = bmesh.new()
-	bm.from_mesh(me)
 
-	if not bm.loops.layers.color.get("color"):
-		color_layer = bm.loops.layers.color.new("color")
+	state=None
+	if incremental:
+		state=bend_stress_states.get(obj.name_full)
+		if state is not None and not state.matches(me):
+			state=None
+
+	if state is None:
+		state=BendStressState(me)
+		faces_processed=len(state.face_max)
 	else:
-		color_layer = bm.loops.layers.color.get("color")
+		faces_processed=state.update(me)
 
-	bend_data={}
+	if incremental:
+		bend_stress_states[obj.name_full]=state
+	else:
+		bend_stress_states.pop(obj.name_full,None)
 
-	min_max_angle=180
-	max_max_angle=0
+	bend_data=state.face_max
+	min_max_angle=state.min_angle
+	max_max_angle=state.max_angle
 
-	for f in bm.faces:
-		
-		max_angle=0
-		
-		for edge in f.edges:
-			linked=edge.link_faces
-			for link_face in linked:
-				if f.index!=link_face.index:
-					angle=degrees(f.normal.angle(link_face.normal))
-					
-					if angle>max_angle:
-						max_angle=angle
-					#print("linked: %d angle: %f"%(link_face.index,angle))
-					
-		#print("Face: %d max_angle: %f"%(f.index,max_angle))
-		bend_data[f.index]=max_angle
-		
-		if max_angle>max_max_angle:
-			max_max_angle=max_angle
-			
-		if max_angle<min_max_angle:
-			min_max_angle=max_angle
-			
-	print(bend_data)
+	if debug:
+		logger.debug("Bend data: %s",bend_data)
 	bend_diff=max_max_angle-min_max_angle
 
-	print("Min: %f Max: %f Diff: %f"%(min_max_angle,max_max_angle,bend_diff))
-
-	for f in bm.faces:
-		angle=bend_data[f.index]
-		this_diff=abs(min_max_angle-angle)
-			
-		color_value=0
-			
-		if this_diff>0:
-			color_value=this_diff/bend_diff
-			
-		rgb = [color_value,0,0,1]
-		
-		for loop in f.loops:
-			loop[color_layer]=rgb
-			
-		print("poly: %d - %f this_diff: %f color_value: %f"%(f.index,angle,this_diff,color_value))
+	logger.debug("Min: %f Max: %f Diff: %f",min_max_angle,max_max_angle,bend_diff)
+
+	if use_attribute:
+		write_face_attribute(me, state.values)
+		material_helper.assign_material(obj, material_helper.get_material_bend_stress())
+	else:
+		write_face_colors(me, state.loop_total, state.values)
 
-	bm.to_mesh(me)
 	me.update()
 
+	logger.info("%s: Faces processed: %d Min: %f Max: %f (%.3f s)",
+		obj.name,faces_processed,min_max_angle,max_max_angle,time.perf_counter()-start_time)
+
 
 
 